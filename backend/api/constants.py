@@ -3,5 +3,44 @@
 # Константы пагинации.
 DEFAULT_PAGE_SIZE = 6
 DEFAULT_PAGE_LIMIT_PARAM = 'limit'
+DEFAULT_CURSOR_PARAM = 'cursor'
 DEFAULT_RECIPES_LIMIT_PARAM = 'recipes_limit'
-DEFAULT_RECIPES_LIMIT_VALUE = 999
+DEFAULT_RECIPES_LIMIT_VALUE = 50
+MAX_RECIPES_LIMIT_VALUE = 50
+
+# Константы поиска.
+FUZZY_SEARCH_PARAM = 'fuzzy'
+TRUE_VALUES = ('1', 'true', 'True', 'yes')
+
+# Константы справочных данных.
+REFERENCE_CACHE_CONTROL = 'public, no-cache'
+
+# Константы списка покупок.
+SHOPPING_CART_FORMAT_PARAM = 'format'
+SHOPPING_CART_FILENAME = 'shopping_list_{date}.{format}'
+
+# Константы пакетных операций.
+MAX_BULK_IDS = 100
+BULK_STATUS_CREATED = 'created'
+BULK_STATUS_EXISTS = 'exists'
+BULK_STATUS_DELETED = 'deleted'
+BULK_STATUS_MISSING = 'missing'
+BULK_STATUS_NOT_FOUND = 'not_found'
+BULK_STATUS_FORBIDDEN = 'forbidden'
+
+# Константы загрузки изображений.
+BASE64_DECODE_CHUNK_SIZE = 64 * 1024
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+
+# Константы замера производительности.
+METRICS_PREFIX = 'foodgram'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+METRICS_DB_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METRICS_FLUSH_INTERVAL_SECONDS = 1
+METRICS_UNMATCHED_ROUTE = 'unmatched'
+# Файл с итогами завершившихся процессов и блокировка его записи.
+METRICS_AGGREGATE_FILENAME = 'aggregate.json'
+METRICS_LOCK_FILENAME = 'aggregate.lock'
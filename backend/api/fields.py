@@ -0,0 +1,123 @@
+"""Модуль с полями сериализаторов приложения API проекта Foodgram."""
+
+import binascii
+import uuid
+
+import filetype
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from api.constants import BASE64_DECODE_CHUNK_SIZE, IMAGE_UPLOAD_MAX_SIZE
+from recipes.images import get_derivative_urls
+
+BASE64_HEADER_SEPARATOR = ';base64,'
+BASE64_WHITESPACE = b' \t\r\n'
+
+
+class DeferredBase64ImageField(Base64ImageField):
+    """Поле изображения в base64 с отложенной обработкой.
+
+    Строка декодируется по частям сразу во временный файл, поэтому
+    расход памяти на загрузку не зависит от размера изображения.
+    Формат проверяется Pillow по этому файлу, а пересжатие
+    выполняется фоновым заданием.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('_DjangoImageField', forms.FileField)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        start = base64_data.find(BASE64_HEADER_SEPARATOR)
+        start = 0 if start == -1 else start + len(BASE64_HEADER_SEPARATOR)
+        uploaded_file = TemporaryUploadedFile(
+            str(uuid.uuid4()), None, 0, None
+        )
+        try:
+            uploaded_file.size = self.decode_to_file(
+                base64_data, start, uploaded_file
+            )
+            extension = self.get_uploaded_file_extension(uploaded_file)
+        except ValidationError:
+            uploaded_file.close()
+            raise
+        uploaded_file.name = f'{uploaded_file.name}.{extension}'
+        return super(Base64FieldMixin, self).to_internal_value(uploaded_file)
+
+    def decode_to_file(self, base64_data, start, file):
+        """Декодирует base64 по частям в файл и отдаёт его размер."""
+        size = 0
+        tail = b''
+        chunk_size = BASE64_DECODE_CHUNK_SIZE
+        for offset in range(start, len(base64_data), chunk_size):
+            try:
+                chunk = base64_data[offset:offset + chunk_size].encode('ascii')
+            except UnicodeEncodeError:
+                raise ValidationError(self.INVALID_FILE_MESSAGE)
+            chunk = tail + chunk.translate(None, BASE64_WHITESPACE)
+            complete = len(chunk) - len(chunk) % 4
+            tail = chunk[complete:]
+            size += self.write_decoded(chunk[:complete], file)
+            if size > IMAGE_UPLOAD_MAX_SIZE:
+                raise ValidationError('Изображение слишком большое.')
+        if tail or not size:
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        file.seek(0)
+        return size
+
+    def write_decoded(self, chunk, file):
+        """Записывает в файл декодированную часть строки."""
+        try:
+            decoded = binascii.a2b_base64(chunk)
+        except binascii.Error:
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        file.write(decoded)
+        return len(decoded)
+
+    def get_uploaded_file_extension(self, file):
+        """Проверяет изображение по файлу и отдаёт его расширение."""
+        extension = filetype.guess_extension(file.read(261))
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                image.verify()
+        except Exception:
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        file.seek(0)
+        extension = (extension or image_format).lower()
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        return extension
+
+
+class ImageDerivativesField(serializers.ReadOnlyField):
+    """Поле с адресами уменьшенных копий изображения.
+
+    Отдаёт для каждого размера ширину и адреса файлов в исходном
+    формате и в WebP, из которых клиент собирает srcset.
+    """
+
+    def __init__(self, sizes, **kwargs):
+        self.sizes = sizes
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        derivatives = get_derivative_urls(value, self.sizes)
+        if derivatives is None:
+            return None
+        request = self.context.get('request')
+        if request is not None:
+            for urls in derivatives.values():
+                urls['src'] = request.build_absolute_uri(urls['src'])
+                urls['webp'] = request.build_absolute_uri(urls['webp'])
+        return derivatives
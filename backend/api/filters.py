@@ -3,6 +3,7 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 
+from recipes.fulltext import search_recipes
 from recipes.models import Ingredient, Recipe, Tag
 
 User = get_user_model()
@@ -35,6 +36,7 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_custom_filter'
     )
+    search = filters.CharFilter(method='search_custom_filter')
 
     class Meta:
         model = Recipe
@@ -53,3 +55,7 @@ class RecipeFilter(FilterSet):
         if user.is_authenticated and value:
             return recipes.filter(shoppingcarts__user=user)
         return recipes
+
+    def search_custom_filter(self, recipes, name, value):
+        """Ищет рецепты по названию и тексту с ранжированием."""
+        return search_recipes(recipes, value)
@@ -0,0 +1,498 @@
+"""Модуль с замером производительности запросов проекта Foodgram.
+
+Промежуточный слой замеряет полное время запроса, число и время
+SQL-запросов и время сериализации, отдаёт их в заголовке Server-Timing
+и копит гистограммы по маршрутам. Каждый процесс gunicorn раз
+в секунду фоновым потоком сбрасывает свои итоги в отдельный файл
+общего каталога, а эндпоинт метрик складывает файлы всех процессов
+и отдаёт их в текстовом формате Prometheus. Если замер выключен
+в настройках, промежуточный слой не подключается и ничего не стоит.
+"""
+
+import atexit
+import fcntl
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connection
+from django.http import HttpResponse
+from rest_framework.serializers import BaseSerializer
+
+from .constants import (
+    METRICS_AGGREGATE_FILENAME, METRICS_CONTENT_TYPE,
+    METRICS_DB_QUERY_BUCKETS, METRICS_DURATION_BUCKETS,
+    METRICS_FLUSH_INTERVAL_SECONDS, METRICS_LOCK_FILENAME, METRICS_PREFIX,
+    METRICS_UNMATCHED_ROUTE
+)
+
+logger = logging.getLogger(__name__)
+
+local = threading.local()
+
+
+class RequestTimings:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.render_started_at = None
+
+    def record_query(self, execute, sql, params, many, context):
+        """Замеряет SQL-запрос, обёртка для connection.execute_wrapper."""
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started_at
+            self.db_queries += 1
+
+    def record_render(self, response):
+        """Добавляет время отрисовки ответа ко времени сериализации."""
+        self.serialize_time += time.perf_counter() - self.render_started_at
+        return response
+
+    def get_server_timing(self, total_time):
+        """Отдаёт значение заголовка Server-Timing в миллисекундах."""
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.2f};'
+            f'desc="{self.db_queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.2f}',
+            f'total;dur={total_time * 1000:.2f}'
+        ))
+
+
+def install_serializer_timing():
+    """Замеряет сериализацию через свойство data сериализаторов DRF.
+
+    Время считается только для внешнего сериализатора, вложенные
+    сериализаторы входят в его время. Вызывается один раз и только
+    при включённом замере.
+    """
+    data = BaseSerializer.data
+    if getattr(data.fget, 'is_timed', False):
+        return
+
+    def timed_data(serializer):
+        timings = getattr(local, 'timings', None)
+        if timings is None or timings.serializing:
+            return data.fget(serializer)
+        timings.serializing = True
+        started_at = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            timings.serialize_time += time.perf_counter() - started_at
+            timings.serializing = False
+
+    timed_data.is_timed = True
+    BaseSerializer.data = property(timed_data)
+
+
+def new_entry():
+    """Отдаёт пустые итоги маршрута."""
+    return {
+        'statuses': {},
+        'duration_buckets': [0] * (len(METRICS_DURATION_BUCKETS) + 1),
+        'duration_sum': 0.0,
+        'db_query_buckets': [0] * (len(METRICS_DB_QUERY_BUCKETS) + 1),
+        'db_queries_sum': 0,
+        'db_time_sum': 0.0,
+        'serialize_time_sum': 0.0
+    }
+
+
+def merge_entry(total, entry):
+    """Прибавляет итоги маршрута одного процесса к общим."""
+    for status, count in entry['statuses'].items():
+        total['statuses'][status] = total['statuses'].get(status, 0) + count
+    for field in ('duration_buckets', 'db_query_buckets'):
+        total[field] = [
+            left + right for left, right in zip(total[field], entry[field])
+        ]
+    for field in (
+        'duration_sum', 'db_queries_sum', 'db_time_sum', 'serialize_time_sum'
+    ):
+        total[field] += entry[field]
+
+
+def is_process_alive(pid):
+    """Проверяет, работает ли процесс с указанным pid."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_records(path):
+    """Отдаёт записи файла итогов или None, если файл не прочитать."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_records(path, entries):
+    """Атомарно записывает итоги по маршрутам в файл."""
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump(
+            [
+                {'route': route, 'method': method, **entry}
+                for (route, method), entry in entries.items()
+            ],
+            file
+        )
+    os.replace(temporary_path, path)
+
+
+def merge_records(totals, records):
+    """Прибавляет записи файла итогов к итогам по маршрутам."""
+    for record in records:
+        record = dict(record)
+        key = (record.pop('route'), record.pop('method'))
+        merge_entry(totals.setdefault(key, new_entry()), record)
+
+
+class FileMetricsCollector:
+    """Сборщик итогов по маршрутам с общим для процессов каталогом.
+
+    Процесс пишет свои итоги целиком в собственный файл, поэтому
+    блокировки между процессами при записи не нужны. Файлы
+    завершившихся процессов новый процесс при запуске переносит
+    в общий файл итогов под блокировкой, чтобы счётчики Prometheus
+    не уменьшались, а число файлов не росло с каждым перезапуском.
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def reset(self):
+        """Начинает итоги заново в новом процессе."""
+        self.pid = os.getpid()
+        self.path = os.path.join(
+            self.directory, f'{self.pid}-{uuid.uuid4().hex}.json'
+        )
+        self.entries = {}
+        self.dirty = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.merge_dead_processes()
+        except OSError:
+            logger.exception('Не удалось перенести итоги процессов')
+        threading.Thread(
+            target=self.flush_periodically,
+            args=(self.pid,),
+            name='metrics-flush',
+            daemon=True
+        ).start()
+        atexit.register(self.flush_on_exit, self.pid)
+
+    def get_dead_process_paths(self):
+        """Отдаёт файлы итогов процессов, которые уже завершились."""
+        paths = []
+        for filename in os.listdir(self.directory):
+            pid, separator, rest = filename.partition('-')
+            if not (
+                separator and pid.isdigit() and rest.endswith('.json')
+            ):
+                continue
+            path = os.path.join(self.directory, filename)
+            if path != self.path and (
+                int(pid) == self.pid or not is_process_alive(int(pid))
+            ):
+                paths.append(path)
+        return paths
+
+    def lock_directory(self, operation):
+        """Открывает файл блокировки каталога и захватывает его."""
+        lock_file = open(
+            os.path.join(self.directory, METRICS_LOCK_FILENAME), 'a'
+        )
+        fcntl.flock(lock_file, operation)
+        return lock_file
+
+    def merge_dead_processes(self):
+        """Переносит итоги завершившихся процессов в общий файл."""
+        with self.lock_directory(fcntl.LOCK_EX):
+            paths = self.get_dead_process_paths()
+            if not paths:
+                return
+            aggregate_path = os.path.join(
+                self.directory, METRICS_AGGREGATE_FILENAME
+            )
+            totals = {}
+            merge_records(totals, read_records(aggregate_path) or ())
+            for path in paths:
+                merge_records(totals, read_records(path) or ())
+            write_records(aggregate_path, totals)
+            for path in paths:
+                os.remove(path)
+
+    def observe(self, route, method, status, duration, timings):
+        """Добавляет замеры запроса к итогам маршрута."""
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()
+            entry = self.entries.setdefault((route, method), new_entry())
+            status = str(status)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            entry['duration_buckets'][
+                bisect_left(METRICS_DURATION_BUCKETS, duration)
+            ] += 1
+            entry['duration_sum'] += duration
+            entry['db_query_buckets'][
+                bisect_left(METRICS_DB_QUERY_BUCKETS, timings.db_queries)
+            ] += 1
+            entry['db_queries_sum'] += timings.db_queries
+            entry['db_time_sum'] += timings.db_time
+            entry['serialize_time_sum'] += timings.serialize_time
+            self.dirty = True
+
+    def flush(self):
+        """Атомарно записывает итоги процесса в его файл."""
+        os.makedirs(self.directory, exist_ok=True)
+        write_records(self.path, self.entries)
+        self.dirty = False
+
+    def flush_periodically(self, pid):
+        """Сбрасывает новые итоги раз в интервал, в том числе без запросов.
+
+        Поток работает, пока итоги принадлежат процессу, в котором
+        он запущен: после fork итоги начинаются заново.
+        """
+        while True:
+            time.sleep(self.flush_interval)
+            with self.lock:
+                if self.pid != pid:
+                    return
+                if self.dirty:
+                    try:
+                        self.flush()
+                    except OSError:
+                        logger.exception('Не удалось сбросить метрики')
+
+    def flush_on_exit(self, pid):
+        """Сбрасывает последние итоги при завершении процесса."""
+        with self.lock:
+            if self.pid == pid and self.dirty:
+                self.flush()
+
+    def collect(self):
+        """Отдаёт итоги всех процессов, сложенные по маршрутам.
+
+        Файлы читаются под общей блокировкой, чтобы перенос итогов
+        в общий файл не попал в замер наполовину.
+        """
+        with self.lock:
+            if self.pid == os.getpid() and self.dirty:
+                self.flush()
+        totals = {}
+        if not os.path.isdir(self.directory):
+            return totals
+        with self.lock_directory(fcntl.LOCK_SH):
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.json'):
+                    merge_records(
+                        totals,
+                        read_records(os.path.join(self.directory, filename))
+                        or ()
+                    )
+        return totals
+
+
+collector = FileMetricsCollector(
+    settings.PERFORMANCE_METRICS_DIR,
+    METRICS_FLUSH_INTERVAL_SECONDS
+)
+
+
+def get_route(request):
+    """Отдаёт имя маршрута запроса для меток метрик."""
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return METRICS_UNMATCHED_ROUTE
+    return resolver_match.view_name or resolver_match.route
+
+
+def iter_streaming_content(content, timings, observe):
+    """Отдаёт потоковый ответ, замеряя SQL-запросы во время отдачи.
+
+    Итоги запроса записываются, когда ответ отдан или закрыт,
+    поэтому в них входят и запросы, и время отдачи. Заголовок
+    Server-Timing к этому моменту уже отправлен и их не содержит.
+    """
+    try:
+        with connection.execute_wrapper(timings.record_query):
+            yield from content
+    finally:
+        observe()
+
+
+class PerformanceMetricsMiddleware:
+    """Промежуточный слой замера производительности запросов."""
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install_serializer_timing()
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        local.timings = timings
+        started_at = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.record_query):
+                response = self.get_response(request)
+        finally:
+            local.timings = None
+        response['Server-Timing'] = timings.get_server_timing(
+            time.perf_counter() - started_at
+        )
+
+        def observe():
+            collector.observe(
+                get_route(request),
+                request.method,
+                response.status_code,
+                time.perf_counter() - started_at,
+                timings
+            )
+
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = iter_streaming_content(
+                response.streaming_content, timings, observe
+            )
+        else:
+            observe()
+        return response
+
+    def process_template_response(self, request, response):
+        """Замеряет отрисовку ответа DRF как часть сериализации."""
+        timings = getattr(local, 'timings', None)
+        if timings is not None:
+            timings.render_started_at = time.perf_counter()
+            response.add_post_render_callback(timings.record_render)
+        return response
+
+
+def format_labels(**labels):
+    """Отдаёт метки Prometheus с экранированными значениями."""
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+                '\n', '\\n'
+            )
+        )
+        for name, value in labels.items()
+    )
+
+
+def iter_histogram(name, labels, buckets, counts, total):
+    """Отдаёт строки гистограммы Prometheus с накопленными корзинами."""
+    cumulative = 0
+    for bound, count in zip((*buckets, '+Inf'), counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f'{name}_sum{{{labels}}} {total}'
+    yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+def render_metrics(totals):
+    """Отдаёт итоги по маршрутам в текстовом формате Prometheus."""
+    requests = f'{METRICS_PREFIX}_http_requests_total'
+    duration = f'{METRICS_PREFIX}_http_request_duration_seconds'
+    db_queries = f'{METRICS_PREFIX}_http_request_db_queries'
+    db_time = f'{METRICS_PREFIX}_http_request_db_duration_seconds_total'
+    serialize_time = (
+        f'{METRICS_PREFIX}_http_request_serialize_duration_seconds_total'
+    )
+    lines = {
+        requests: [
+            f'# HELP {requests} Число запросов.',
+            f'# TYPE {requests} counter'
+        ],
+        duration: [
+            f'# HELP {duration} Полное время запроса.',
+            f'# TYPE {duration} histogram'
+        ],
+        db_queries: [
+            f'# HELP {db_queries} Число SQL-запросов на запрос.',
+            f'# TYPE {db_queries} histogram'
+        ],
+        db_time: [
+            f'# HELP {db_time} Суммарное время SQL-запросов.',
+            f'# TYPE {db_time} counter'
+        ],
+        serialize_time: [
+            f'# HELP {serialize_time} Суммарное время сериализации.',
+            f'# TYPE {serialize_time} counter'
+        ]
+    }
+    for (route, method), entry in sorted(totals.items()):
+        labels = format_labels(route=route, method=method)
+        for status, count in sorted(entry['statuses'].items()):
+            status_labels = format_labels(
+                route=route, method=method, status=status
+            )
+            lines[requests].append(f'{requests}{{{status_labels}}} {count}')
+        lines[duration].extend(iter_histogram(
+            duration,
+            labels,
+            METRICS_DURATION_BUCKETS,
+            entry['duration_buckets'],
+            entry['duration_sum']
+        ))
+        lines[db_queries].extend(iter_histogram(
+            db_queries,
+            labels,
+            METRICS_DB_QUERY_BUCKETS,
+            entry['db_query_buckets'],
+            entry['db_queries_sum']
+        ))
+        lines[db_time].append(
+            f'{db_time}{{{labels}}} {entry["db_time_sum"]}'
+        )
+        lines[serialize_time].append(
+            f'{serialize_time}{{{labels}}} {entry["serialize_time_sum"]}'
+        )
+    return '\n'.join(
+        line for metric_lines in lines.values() for line in metric_lines
+    ) + '\n'
+
+
+def metrics_view(request):
+    """Отдаёт метрики всех процессов в формате Prometheus.
+
+    Если задан токен, запрос должен передать его в заголовке
+    Authorization: Bearer <токен>.
+    """
+    token = settings.PERFORMANCE_METRICS_TOKEN
+    if token and not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {token}'.encode()
+    ):
+        raise PermissionDenied
+    return HttpResponse(
+        render_metrics(collector.collect()),
+        content_type=METRICS_CONTENT_TYPE
+    )
@@ -0,0 +1,142 @@
+"""Модуль с примесями представлений приложения API проекта Foodgram."""
+
+import gzip
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from recipes.versions import get_version
+from .constants import REFERENCE_CACHE_CONTROL
+
+# Предрассчитанные ответы со всеми объектами в каждом процессе:
+# {модель: (версия, JSON, JSON в gzip)}.
+precomputed_lists = {}
+
+
+def parse_accept_encoding(header):
+    """Отдаёт веса кодировок из заголовка Accept-Encoding.
+
+    Кодировка без параметра q весит 1, с неверным значением q — 0.
+    """
+    encodings = {}
+    for item in header.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[coding.lower()] = quality
+    return encodings
+
+
+class VersionedReferenceMixin:
+    """Примесь условных GET-запросов к справочным данным.
+
+    ETag строится по версии данных модели, поэтому при совпадении
+    If-None-Match ответ 304 отдаётся без обращения к базе данных
+    и сериализатору. Список без параметров рассчитывается один раз
+    на версию и хранится в памяти процесса вместе со сжатой копией.
+    """
+
+    def get_etag(self, gzipped=False):
+        """Отдаёт строгий ETag текущей версии справочных данных."""
+        model = self.queryset.model
+        return '"{}-{}-{}{}"'.format(
+            model._meta.model_name,
+            get_version(model),
+            self.request.accepted_renderer.format,
+            '-gzip' if gzipped else ''
+        )
+
+    def is_not_modified(self, etag):
+        """Проверяет, есть ли у клиента актуальная версия ответа."""
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return False
+        client_etags = {
+            client_etag.strip().removeprefix('W/')
+            for client_etag in if_none_match.split(',')
+        }
+        return bool(client_etags & {'*', etag})
+
+    def accepts_gzip(self):
+        """Проверяет, принимает ли клиент ответ в gzip.
+
+        Кодировка с q=0 запрещена клиентом, а без явного gzip решает
+        значение для *.
+        """
+        encodings = parse_accept_encoding(
+            self.request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        return encodings.get('gzip', encodings.get('*', 0)) > 0
+
+    def finalize_conditional_response(self, response, etag):
+        """Проставляет заголовки кэширования в ответ."""
+        response['ETag'] = etag
+        response['Cache-Control'] = REFERENCE_CACHE_CONTROL
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+    def get_precomputed_list(self):
+        """Отдаёт JSON и его сжатую копию для списка всех объектов."""
+        model = self.queryset.model
+        version = get_version(model)
+        cached = precomputed_lists.get(model)
+        if cached is None or cached[0] != version:
+            content = JSONRenderer().render(
+                self.get_serializer(
+                    self.get_queryset(),
+                    many=True
+                ).data
+            )
+            cached = (version, content, gzip.compress(content))
+            precomputed_lists[model] = cached
+        return cached[1:]
+
+    def list(self, request, *args, **kwargs):
+        precomputed = (
+            not request.query_params
+            and request.accepted_renderer.format == 'json'
+        )
+        gzipped = precomputed and self.accepts_gzip()
+        etag = self.get_etag(gzipped)
+        if self.is_not_modified(etag):
+            return self.finalize_conditional_response(
+                HttpResponseNotModified(), etag
+            )
+        if not precomputed:
+            return self.finalize_conditional_response(
+                self.get_list_response(request, *args, **kwargs), etag
+            )
+        content, gzipped_content = self.get_precomputed_list()
+        if not gzipped:
+            return self.finalize_conditional_response(
+                HttpResponse(content, content_type='application/json'), etag
+            )
+        response = HttpResponse(
+            gzipped_content,
+            content_type='application/json'
+        )
+        response['Content-Encoding'] = 'gzip'
+        return self.finalize_conditional_response(response, etag)
+
+    def get_list_response(self, request, *args, **kwargs):
+        """Отдаёт ответ со списком объектов с учётом параметров запроса."""
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if self.is_not_modified(etag):
+            return self.finalize_conditional_response(
+                HttpResponseNotModified(), etag
+            )
+        return self.finalize_conditional_response(
+            super().retrieve(request, *args, **kwargs), etag
+        )
@@ -1,8 +1,16 @@
 """Модуль с настройками пагинации проекта Foodgram."""
 
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor, CursorPagination, PageNumberPagination
+)
 
-from .constants import DEFAULT_PAGE_LIMIT_PARAM, DEFAULT_PAGE_SIZE
+from recipes.models import Recipe
+from .constants import (
+    DEFAULT_CURSOR_PARAM, DEFAULT_PAGE_LIMIT_PARAM, DEFAULT_PAGE_SIZE
+)
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -10,3 +18,142 @@ class StandardResultsSetPagination(PageNumberPagination):
 
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = DEFAULT_PAGE_LIMIT_PARAM
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Пагинация рецептов по курсору.
+
+    Позиция — это значения всех полей сортировки рецептов
+    (-created_at, -id) последней строки страницы. Поле id уникально,
+    поэтому позиция однозначна, смещение в курсоре не нужно, а страница
+    читается по индексу условием на пару полей, без COUNT и OFFSET.
+    """
+
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = DEFAULT_PAGE_LIMIT_PARAM
+    cursor_query_param = DEFAULT_CURSOR_PARAM
+    ordering = Recipe._meta.ordering
+    position_separator = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+        queryset = queryset.order_by(*(
+            self.get_reversed_ordering() if reverse else self.ordering
+        ))
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(position, reverse)
+            )
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_reversed_ordering(self):
+        """Отдаёт сортировку в обратном порядке."""
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def get_position_filter(self, position, reverse):
+        """Отдаёт условие на строки после позиции в порядке страниц.
+
+        Для полей (a, b) по убыванию это a < x OR (a = x AND b < y).
+        """
+        condition = None
+        for field, value in reversed(
+            list(zip(self.ordering, self.parse_position(position)))
+        ):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            following = Q(**{f'{name}__{lookup}': value})
+            condition = following if condition is None else (
+                following | Q(**{name: value}) & condition
+            )
+        return condition
+
+    def parse_position(self, position):
+        """Разбирает позицию курсора в значения полей сортировки."""
+        values = position.split(self.position_separator)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                Recipe._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return self.position_separator.join(
+            str(getattr(instance, field.lstrip('-'))) for field in ordering
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[-1], self.ordering)
+            if self.page else self.cursor.position
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[0], self.ordering)
+            if self.page else self.cursor.position
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position)
+        )
+
+
+class RecipePagination(StandardResultsSetPagination):
+    """Пагинация рецептов.
+
+    По умолчанию постраничная, как и раньше. Если в запросе передан
+    параметр cursor (в том числе пустой для первой страницы),
+    используется пагинация по курсору.
+    """
+
+    cursor_pagination_class = RecipeCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_pagination_class.cursor_query_param in (
+            request.query_params
+        ):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
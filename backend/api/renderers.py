@@ -0,0 +1,44 @@
+"""Модуль с рендерерами приложения API проекта Foodgram."""
+
+from rest_framework import status
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Рендерер простого текста.
+
+    Нужен для согласования формата ?format=txt, сам файл отдаётся
+    потоковым ответом; через рендерер проходят только ошибки.
+    Ошибки отдаются в JSON, как и без параметра format, чтобы клиент
+    разбирал их одинаково.
+    """
+
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None and not status.is_success(
+            response.status_code
+        ):
+            response['Content-Type'] = JSONRenderer.media_type
+            return JSONRenderer().render(
+                data, JSONRenderer.media_type, renderer_context
+            )
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(
+                f'{key}: {value}' for key, value in data.items()
+            )
+        elif isinstance(data, list):
+            data = '\n'.join(str(item) for item in data)
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    """Рендерер CSV для согласования формата ?format=csv."""
+
+    media_type = 'text/csv'
+    format = 'csv'
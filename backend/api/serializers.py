@@ -1,24 +1,31 @@
 """Модуль с сериализаторами проекта Foodgram."""
 
 
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.constants import MAX_BULK_IDS
+from api.fields import DeferredBase64ImageField, ImageDerivativesField
+from api.utils import get_recipes_limit
 from api.validators import ingredients_or_tags_validation
 from recipes.constants import (
+    AVATAR_DERIVATIVES,
+    AVATAR_MAX_SIZE,
     MIN_AMOUNT,
-    MIN_COOKING_TIME
+    MIN_COOKING_TIME,
+    RECIPE_IMAGE_DERIVATIVES,
+    RECIPE_IMAGE_MAX_SIZE
 )
+from recipes.images import enqueue_image
 from recipes.models import (
     Favorite, Ingredient,
     Recipe, RecipeIngredient,
-    ShoppingCart, Subscription, Tag, User
-)
-from .constants import (
-    DEFAULT_RECIPES_LIMIT_PARAM,
-    DEFAULT_RECIPES_LIMIT_VALUE
+    ShoppingCart, ShoppingListItem, Subscription, Tag, User
 )
+from recipes.shopping_list import refresh_recipe_in_shopping_lists
 
 
 class UserSerializer(DjoserUserSerializer):
@@ -27,18 +34,27 @@ class UserSerializer(DjoserUserSerializer):
     is_subscribed = serializers.SerializerMethodField(
         read_only=True
     )
-    avatar = Base64ImageField()
+    avatar = DeferredBase64ImageField()
+    avatar_status = serializers.ReadOnlyField()
+    avatar_sizes = ImageDerivativesField(
+        source='avatar',
+        sizes=AVATAR_DERIVATIVES
+    )
 
     class Meta(DjoserUserSerializer.Meta):
         model = User
         fields = (
             *DjoserUserSerializer.Meta.fields,
             'is_subscribed',
-            'avatar'
+            'avatar',
+            'avatar_status',
+            'avatar_sizes'
         )
 
     def get_is_subscribed(self, author):
         """Проверяет подписку на пользователя."""
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         current_user = self.context['request'].user
         return (
             current_user.is_authenticated
@@ -56,6 +72,13 @@ class UserSerializer(DjoserUserSerializer):
             )
         return data
 
+    def update(self, instance, validated_data):
+        """Ставит новый аватар в очередь на обработку."""
+        avatar = validated_data.pop('avatar')
+        instance = super().update(instance, validated_data)
+        enqueue_image(instance, 'avatar', avatar, AVATAR_MAX_SIZE)
+        return instance
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тегов."""
@@ -105,7 +128,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True,
         source='recipe_ingredients'
     )
-    image = Base64ImageField()
+    image = Base64ImageField(read_only=True)
+    image_sizes = ImageDerivativesField(
+        source='image',
+        sizes=RECIPE_IMAGE_DERIVATIVES
+    )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -119,6 +146,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             'tags',
             'ingredients',
             'image',
+            'image_sizes',
+            'image_status',
             'cooking_time',
             'is_favorited',
             'is_in_shopping_cart'
@@ -137,19 +166,21 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, recipe):
         """Проверяет избранность рецепта."""
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         return self.is_recipe_in(recipe, Favorite)
 
     def get_is_in_shopping_cart(self, recipe):
         """Проверяет включение рецепта в список покупок."""
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         return self.is_recipe_in(recipe, ShoppingCart)
 
 
 class IngredientAddRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор добавления продукта в рецепт."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField(min_value=MIN_AMOUNT)
 
     class Meta:
@@ -164,14 +195,13 @@ class RecipeModificateSerializer(serializers.ModelSerializer):
     """Сериализатор добавления рецепта."""
 
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1)
     )
     ingredients = IngredientAddRecipeSerializer(
         many=True
     )
-    image = Base64ImageField()
+    image = DeferredBase64ImageField()
     cooking_time = serializers.IntegerField(min_value=MIN_COOKING_TIME)
 
     class Meta:
@@ -203,57 +233,143 @@ class RecipeModificateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Не выбрано изображение рецепта!'
             )
-        ingredients_or_tags_validation(
+        tags = ingredients_or_tags_validation(
             data.get('tags'),
-            'tags'
+            'tags',
+            Tag.objects.all()
         )
-        ingredients_or_tags_validation(
-            data.get('ingredients'),
-            'ingredients'
+        data['tags'] = [tags[tag_id] for tag_id in data['tags']]
+        ingredients = data.get('ingredients') or []
+        loaded_ingredients = ingredients_or_tags_validation(
+            [ingredient['id'] for ingredient in ingredients],
+            'ingredients',
+            Ingredient.objects.all()
         )
+        for ingredient in ingredients:
+            ingredient['id'] = loaded_ingredients[ingredient['id']]
         return data
 
     def to_representation(self, instance):
         """Преобразовывает данные в подходящее представление."""
+        prefetch_related_objects(
+            (instance,),
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
         return RecipeSerializer(
             instance,
             context=self.context
         ).data
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        image = validated_data.pop('image')
         recipe = super().create(validated_data)
         self.add_ingredients(
             ingredients,
             recipe
         )
         recipe.tags.set(tags)
+        enqueue_image(recipe, 'image', image, RECIPE_IMAGE_MAX_SIZE)
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        """Приводит продукты рецепта к переданным, меняя только разницу.
+
+        Отдаёт id продуктов, мера или наличие которых изменились.
+        """
+        stored = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        submitted = {
+            ingredient['id'].id: ingredient for ingredient in ingredients
+        }
+        changed = []
+        for ingredient_id, recipe_ingredient in stored.items():
+            ingredient = submitted.get(ingredient_id)
+            if ingredient and recipe_ingredient.amount != ingredient['amount']:
+                recipe_ingredient.amount = ingredient['amount']
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        deleted_ids = stored.keys() - submitted.keys()
+        RecipeIngredient.objects.filter(
+            recipe=recipe,
+            ingredient__in=deleted_ids
+        ).delete()
+        created_ids = submitted.keys() - stored.keys()
+        self.add_ingredients(
+            (submitted[ingredient_id] for ingredient_id in created_ids),
+            recipe
+        )
+        return (
+            {recipe_ingredient.ingredient_id for recipe_ingredient in changed}
+            | deleted_ids
+            | created_ids
+        )
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Модификация рецепта."""
-        ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.add_ingredients(
-            ingredients,
+        changed_ingredient_ids = self.update_ingredients(
+            validated_data.pop('ingredients'),
             instance
         )
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        return super().update(instance, validated_data)
+        instance.tags.set(validated_data.pop('tags'))
+        refresh_recipe_in_shopping_lists(
+            instance,
+            changed_ingredient_ids
+        )
+        image = validated_data.pop('image')
+        instance = super().update(instance, validated_data)
+        enqueue_image(instance, 'image', image, RECIPE_IMAGE_MAX_SIZE)
+        return instance
+
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Сериализатор итогов списка покупок."""
+
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.ReadOnlyField(source='total_amount')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount',
+            'recipe_count'
+        )
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор основных данных рецепта."""
 
+    image_sizes = ImageDerivativesField(
+        source='image',
+        sizes=RECIPE_IMAGE_DERIVATIVES
+    )
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_sizes',
             'cooking_time'
         )
         read_only_fields = fields
@@ -262,7 +378,7 @@ class RecipeShortSerializer(serializers.ModelSerializer):
 class SubscriptionsSerializer(UserSerializer):
     """Сериализатор подписок."""
 
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.ReadOnlyField()
     recipes = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
@@ -275,14 +391,27 @@ class SubscriptionsSerializer(UserSerializer):
 
     def get_recipes(self, author):
         """Отдаёт список рецептов с возможностью лимитирования."""
+        if hasattr(author, 'limited_recipes'):
+            recipes = author.limited_recipes
+        else:
+            recipes = author.recipes.all()[
+                :get_recipes_limit(self.context['request'])
+            ]
         return RecipeShortSerializer(
-            author.recipes.all()[
-                :int(
-                    self.context['request'].GET.get(
-                        DEFAULT_RECIPES_LIMIT_PARAM,
-                        DEFAULT_RECIPES_LIMIT_VALUE
-                    )
-                )
-            ],
+            recipes,
             many=True
         ).data
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_IDS
+    )
+
+    def validate_ids(self, ids):
+        """Убирает повторы id с сохранением порядка."""
+        return list(dict.fromkeys(ids))
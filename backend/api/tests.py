@@ -0,0 +1,581 @@
+"""Модуль с тестами приложения API проекта Foodgram."""
+
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Subscription, Tag, User
+)
+from .fields import DeferredBase64ImageField
+from .metrics import (
+    FileMetricsCollector, RequestTimings, iter_streaming_content, new_entry,
+    write_records
+)
+from .mixins import precomputed_lists
+
+
+class ReferenceListEncodingTest(TestCase):
+    """Сжатый список справочника отдаётся только с разрешения клиента."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def setUp(self):
+        precomputed_lists.clear()
+
+    def get_content_encoding(self, accept_encoding):
+        response = self.client.get(
+            '/api/ingredients/', HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.get('Content-Encoding')
+
+    def test_gzip_is_used_when_accepted(self):
+        for accept_encoding in ('gzip', 'br, gzip;q=0.5', '*', 'GZIP;Q=1'):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(
+                    self.get_content_encoding(accept_encoding), 'gzip'
+                )
+
+    def test_gzip_is_not_used_when_refused(self):
+        for accept_encoding in (
+            '', 'identity', 'gzip;q=0', 'gzip;q=0.0, br', '*, gzip;q=0',
+            '*;q=0', 'gzip;q=abc'
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertIsNone(self.get_content_encoding(accept_encoding))
+
+    def test_filtered_list_etag_matches_uncompressed_response(self):
+        url = '/api/ingredients/?name=со'
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.get('Content-Encoding'))
+        etag = response['ETag']
+        self.assertNotIn('gzip', etag)
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(
+            url,
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=etag.replace('-json', '-json-gzip')
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+
+
+class RecipeCursorPaginationTest(TestCase):
+    """Курсор проходит рецепты с одинаковым временем создания."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password'
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'Рецепт {index}',
+                text='Текст рецепта.',
+                cooking_time=10
+            )
+            for index in range(4)
+        )
+        Recipe.objects.update(created_at=timezone.now())
+        cls.expected_ids = list(Recipe.objects.values_list('id', flat=True))
+
+    def get_ids(self, url, link):
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            ids.append([recipe['id'] for recipe in data['results']])
+            url = data[link]
+        return ids
+
+    def test_pages_forward_and_back(self):
+        pages = self.get_ids('/api/recipes/?cursor=&limit=3', 'next')
+        self.assertEqual(sum(pages, []), self.expected_ids)
+        last_page = self.client.get(
+            '/api/recipes/?cursor=&limit=3'
+        ).json()['next']
+        self.assertEqual(
+            sum(reversed(self.get_ids(last_page, 'previous')), []),
+            self.expected_ids
+        )
+
+    def test_invalid_cursor(self):
+        self.assertEqual(
+            self.client.get('/api/recipes/?cursor=cD14fHk%3D').status_code,
+            404
+        )
+
+
+class FileMetricsCollectorTest(TestCase):
+    """Итоги процессов не теряются и не копятся по файлам."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.collector = FileMetricsCollector(self.directory, 0.05)
+        self.addCleanup(setattr, self.collector, 'pid', None)
+
+    def observe(self):
+        self.collector.observe('api:tags-list', 'GET', 200, 0.01, (
+            RequestTimings()
+        ))
+
+    def test_dead_process_files_are_merged(self):
+        process = subprocess.Popen((sys.executable, '-c', ''))
+        process.wait()
+        entry = new_entry()
+        entry['statuses'] = {'200': 1}
+        dead_path = os.path.join(self.directory, f'{process.pid}-dead.json')
+        write_records(dead_path, {('api:tags-list', 'GET'): entry})
+        self.observe()
+        self.assertFalse(os.path.exists(dead_path))
+        self.assertEqual(
+            self.collector.collect()[('api:tags-list', 'GET')]['statuses'],
+            {'200': 2}
+        )
+        self.assertEqual(
+            sorted(
+                filename for filename in os.listdir(self.directory)
+                if filename.endswith('.json')
+            ),
+            sorted(('aggregate.json', os.path.basename(self.collector.path)))
+        )
+
+    def test_idle_process_is_flushed(self):
+        self.observe()
+        time.sleep(0.3)
+        with open(self.collector.path, encoding='utf-8') as file:
+            self.assertEqual(json.load(file)[0]['statuses'], {'200': 1})
+
+    def test_streaming_queries_are_counted(self):
+        timings = RequestTimings()
+        observed = []
+
+        def content():
+            yield str(Ingredient.objects.count()).encode()
+
+        self.assertEqual(
+            b''.join(iter_streaming_content(
+                content(), timings, lambda: observed.append(True)
+            )),
+            b'0'
+        )
+        self.assertEqual(timings.db_queries, 1)
+        self.assertEqual(observed, [True])
+
+
+class DownloadShoppingCartTest(TestCase):
+    """Выгрузка списка покупок в текстовых форматах."""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Блины',
+            text='Текст рецепта.',
+            cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe,
+            ingredient=Ingredient.objects.create(
+                name='мука', measurement_unit='г'
+            ),
+            amount=200
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_errors_are_json(self):
+        response = self.client.get(self.url, {'format': 'txt'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_csv_lists_recipes(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines(),
+            [
+                'name,measurement_unit,amount',
+                'мука,г,200',
+                '',
+                'recipe',
+                'Блины'
+            ]
+        )
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [
+            User.objects.create_user(
+                username=f'author{index}',
+                email=f'author{index}@example.com',
+                password='password'
+            )
+            for index in range(4)
+        ]
+        cls.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='password'
+        )
+        tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(3)
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'продукт {index}', measurement_unit='г')
+            for index in range(10)
+        )
+        for index in range(12):
+            recipe = Recipe.objects.create(
+                author=authors[index % len(authors)],
+                name=f'Рецепт {index}',
+                text='Текст рецепта.',
+                cooking_time=10,
+                image=f'recipes/images/cd/{index:064x}.jpg'
+            )
+            recipe.tags.set(tags[:1 + index % len(tags)])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(index + shift) % len(ingredients)],
+                    amount=10
+                )
+                for shift in range(3)
+            )
+            if index % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if index % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        for author in authors[:2]:
+            Subscription.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assert_same_queries(self):
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get('/api/recipes/?limit=2')
+        self.assertEqual(len(response.json()['results']), 2)
+        with self.assertNumQueries(len(small_page)):
+            response = self.client.get('/api/recipes/?limit=10')
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_anonymous_list_queries(self):
+        self.assert_same_queries()
+
+    def test_authenticated_list_queries(self):
+        self.client.force_authenticate(self.user)
+        self.assert_same_queries()
+
+
+class SubscriptionsQueriesTest(TestCase):
+    """Подписки отдают не больше recipes_limit рецептов на автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='password'
+        )
+        for index in range(4):
+            author = User.objects.create_user(
+                username=f'author{index}',
+                email=f'author{index}@example.com',
+                password='password'
+            )
+            for number in range(3 + index):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'Рецепт {index}.{number}',
+                    text='Текст рецепта.',
+                    cooking_time=10
+                )
+            Subscription.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_subscriptions(self, query):
+        response = self.client.get(f'/api/users/subscriptions/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_recipes_are_limited_per_author(self):
+        for author in self.get_subscriptions('recipes_limit=2'):
+            with self.subTest(author=author['username']):
+                self.assertEqual(len(author['recipes']), 2)
+                self.assertGreater(author['recipes_count'], 2)
+
+    def test_queries_do_not_depend_on_page_and_limit(self):
+        with CaptureQueriesContext(connection) as small_page:
+            self.assertEqual(
+                len(self.get_subscriptions('limit=1&recipes_limit=1')), 1
+            )
+        with self.assertNumQueries(len(small_page)):
+            self.assertEqual(
+                len(self.get_subscriptions('limit=4&recipes_limit=5')), 4
+            )
+
+
+def make_base64_image():
+    """Отдаёт картинку PNG в виде data URL."""
+    output = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(output, 'PNG')
+    return 'data:image/png;base64,{}'.format(
+        base64.b64encode(output.getvalue()).decode()
+    )
+
+
+class RecipeUpdateTest(TestCase):
+    """Изменение рецепта меняет только разницу в продуктах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'продукт {index}', measurement_unit='г')
+            for index in range(4)
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            text='Текст рецепта.',
+            cooking_time=10
+        )
+        cls.recipe.tags.set(cls.tags[:1])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=cls.recipe, ingredient=ingredient, amount=amount
+            )
+            for ingredient, amount in zip(cls.ingredients, (10, 20, 30))
+        )
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name, IMAGE_PROCESSING_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def patch_recipe(self, ingredients, tags):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {
+                    'name': 'Рецепт',
+                    'text': 'Текст рецепта.',
+                    'cooking_time': 10,
+                    'image': make_base64_image(),
+                    'tags': [tag.id for tag in tags],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': amount}
+                        for ingredient, amount in ingredients
+                    ]
+                },
+                format='json'
+            )
+
+    def test_ingredients_are_updated_by_diff(self):
+        first, second, third, fourth = self.ingredients
+        stored_ids = dict(
+            self.recipe.recipe_ingredients.values_list('ingredient', 'id')
+        )
+        response = self.patch_recipe(
+            ((first, 10), (second, 25), (fourth, 5)), self.tags[:1]
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = {
+            ingredient_id: (row_id, amount)
+            for row_id, ingredient_id, amount in (
+                self.recipe.recipe_ingredients.values_list(
+                    'id', 'ingredient', 'amount'
+                )
+            )
+        }
+        self.assertEqual(
+            {
+                ingredient_id: amount
+                for ingredient_id, (_, amount) in rows.items()
+            },
+            {first.id: 10, second.id: 25, fourth.id: 5}
+        )
+        self.assertEqual(rows[first.id][0], stored_ids[first.id])
+        self.assertEqual(rows[second.id][0], stored_ids[second.id])
+        self.assertEqual(
+            set(
+                ShoppingListItem.objects.filter(user=self.user).values_list(
+                    'ingredient', 'total_amount'
+                )
+            ),
+            {(first.id, 10), (second.id, 25), (fourth.id, 5)}
+        )
+
+    def test_ids_are_resolved_with_one_query_each(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch_recipe(
+                [(ingredient, 5) for ingredient in self.ingredients],
+                self.tags
+            )
+        self.assertEqual(response.status_code, 200)
+        for table in ('recipes_ingredient', 'recipes_tag'):
+            with self.subTest(table=table):
+                self.assertEqual(
+                    sum(
+                        f'FROM "{table}" WHERE "{table}"."id" IN'
+                        in query['sql']
+                        for query in queries
+                    ),
+                    1
+                )
+
+    def test_all_missing_ids_are_reported(self):
+        response = self.patch_recipe(
+            [(self.ingredients[0], 5)],
+            [self.tags[0], Tag(id=998), Tag(id=999)]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('998, 999', str(response.json()))
+
+
+class DeferredBase64ImageFieldTest(TestCase):
+    """Изображение в base64 декодируется по частям во временный файл."""
+
+    def setUp(self):
+        self.field = DeferredBase64ImageField()
+        self.content = base64.b64decode(
+            make_base64_image().split(',', 1)[1]
+        )
+
+    def test_chunks_are_decoded_into_temporary_file(self):
+        encoded = base64.encodebytes(self.content).decode()
+        with patch('api.fields.BASE64_DECODE_CHUNK_SIZE', 7):
+            uploaded_file = self.field.to_internal_value(
+                f'data:image/png;base64,{encoded}'
+            )
+        self.addCleanup(uploaded_file.close)
+        self.assertTrue(os.path.exists(uploaded_file.temporary_file_path()))
+        self.assertTrue(uploaded_file.name.endswith('.png'))
+        self.assertEqual(uploaded_file.size, len(self.content))
+        self.assertEqual(uploaded_file.read(), self.content)
+
+    def test_invalid_data_is_rejected(self):
+        encoded = base64.b64encode(self.content).decode()
+        for data in (encoded[:-1], 'я' + encoded, encoded + '!', '===='):
+            with self.subTest(data=data[:10]):
+                with self.assertRaises(ValidationError):
+                    self.field.to_internal_value(data)
+
+    def test_size_limit_stops_decoding(self):
+        with patch('api.fields.IMAGE_UPLOAD_MAX_SIZE', 10), patch(
+            'api.fields.BASE64_DECODE_CHUNK_SIZE', 8
+        ), patch.object(
+            DeferredBase64ImageField, 'write_decoded', autospec=True,
+            side_effect=DeferredBase64ImageField.write_decoded
+        ) as write_decoded:
+            with self.assertRaisesMessage(
+                ValidationError, 'Изображение слишком большое.'
+            ):
+                self.field.to_internal_value(make_base64_image())
+        self.assertLess(write_decoded.call_count, 3)
+
+
+class RecipeSearchTest(TestCase):
+    """Полнотекстовый поиск ранжирует совпадения в названии выше."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password'
+        )
+        cls.in_name, cls.in_text, cls.other = (
+            Recipe.objects.create(
+                author=author, name=name, text=text, cooking_time=10
+            )
+            for name, text in (
+                ('Борщ украинский', 'Свёкла, капуста и картофель.'),
+                ('Суп', 'Подаётся вместо борща со сметаной.'),
+                ('Каша', 'Гречка на воде.')
+            )
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(
+            self.search('борщ'), [self.in_name.id, self.in_text.id]
+        )
+
+    def test_index_follows_updates(self):
+        self.assertEqual(self.search('гречневая'), [])
+        Recipe.objects.filter(pk=self.other.pk).update(
+            name='Гречневая каша'
+        )
+        self.assertEqual(self.search('гречневая'), [self.other.id])
+        self.assertEqual(self.search('!!!'), [])
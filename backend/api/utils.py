@@ -1,41 +1,189 @@
 """Модуль с утилитами приложения API проекта Foodgram."""
 
-from datetime import datetime
+import csv
+import json
+from django.db import transaction
+from django.utils import timezone
 
+from recipes.counters import (
+    COUNTERS, change_counters, counters_changed_by_caller
+)
+from recipes.locks import lock_users
+from recipes.shopping_list import shopping_lists_refreshed_by_caller
 
-def shopping_cart_content(ingredients_and_amounts, recipes, user):
-    """Формирование содержания файла со списком покупок."""
-    current_date = datetime.now().strftime('%d.%m.%y')
-    ingredients_and_amounts_list = [
-        '{}. {} ({}) — {}'.format(
+from .constants import (
+    BULK_STATUS_CREATED, BULK_STATUS_DELETED, BULK_STATUS_EXISTS,
+    BULK_STATUS_FORBIDDEN, BULK_STATUS_MISSING, BULK_STATUS_NOT_FOUND,
+    DEFAULT_RECIPES_LIMIT_PARAM,
+    DEFAULT_RECIPES_LIMIT_VALUE,
+    MAX_RECIPES_LIMIT_VALUE
+)
+
+
+def get_recipes_limit(request):
+    """Отдаёт лимит рецептов автора, ограниченный на стороне сервера."""
+    try:
+        recipes_limit = int(
+            request.GET.get(
+                DEFAULT_RECIPES_LIMIT_PARAM,
+                DEFAULT_RECIPES_LIMIT_VALUE
+            )
+        )
+    except ValueError:
+        recipes_limit = DEFAULT_RECIPES_LIMIT_VALUE
+    return max(0, min(recipes_limit, MAX_RECIPES_LIMIT_VALUE))
+
+
+@transaction.atomic
+def bulk_add_to_delete_from(
+    user, ids, model, field, targets, forbidden_ids=(), delete=False
+):
+    """Пакетно добавляет или удаляет связи пользователя с объектами.
+
+    Существование всех объектов проверяется одним запросом, вставка
+    идёт одним bulk_create, удаление — одним DELETE. Связи меняются
+    под блокировкой пользователя, а счётчики меняются только для
+    реально вставленных записей, которые перечитываются после
+    вставки: bulk_create с ignore_conflicts отдаёт все переданные
+    объекты, в том числе пропущенные. При удалении сигналы счётчиков
+    и пересчёта списка покупок отключаются, и счётчики, как и при
+    вставке, меняются одним UPDATE с F() на каждое приращение,
+    а список покупок пересчитывает вызывающий код. Отдаёт статус
+    по каждому id и множество id, связи с которыми изменились.
+    """
+    found_ids = set(
+        targets.filter(id__in=ids).values_list('id', flat=True)
+    ) - set(forbidden_ids)
+    lock_users(
+        user.id, *(found_ids if targets.model is type(user) else ())
+    )
+    links = model.objects.filter(user=user, **{f'{field}__in': found_ids})
+    linked_ids = set(links.values_list(field, flat=True))
+    if delete:
+        changed_ids = linked_ids
+        with counters_changed_by_caller():
+            with shopping_lists_refreshed_by_caller():
+                links.delete()
+        sign = -1
+        statuses = (BULK_STATUS_DELETED, BULK_STATUS_MISSING)
+    else:
+        model.objects.bulk_create(
+            [
+                model(user=user, **{f'{field}_id': target_id})
+                for target_id in found_ids - linked_ids
+            ],
+            ignore_conflicts=True
+        )
+        changed_ids = set(links.values_list(field, flat=True)) - linked_ids
+        sign = 1
+        statuses = (BULK_STATUS_CREATED, BULK_STATUS_EXISTS)
+    if model in COUNTERS:
+        change_counters(
+            model,
+            [
+                model(user=user, **{f'{field}_id': target_id})
+                for target_id in changed_ids
+            ],
+            sign=sign
+        )
+    results = []
+    for target_id in ids:
+        if target_id in forbidden_ids:
+            status = BULK_STATUS_FORBIDDEN
+        elif target_id not in found_ids:
+            status = BULK_STATUS_NOT_FOUND
+        else:
+            status = statuses[target_id not in changed_ids]
+        results.append({'id': target_id, 'status': status})
+    return results, changed_ids
+
+
+def shopping_cart_header(user):
+    """Отдаёт данные заголовка списка покупок."""
+    return (
+        f'{user.first_name} {user.last_name}',
+        timezone.localdate().strftime('%d.%m.%y')
+    )
+
+
+def shopping_cart_txt(ingredients_and_amounts, recipes, user):
+    """Построчно формирует список покупок в виде текста."""
+    full_name, current_date = shopping_cart_header(user)
+    yield f'Список покупок пользователя: "{full_name}"\n'
+    yield f'Дата: {current_date}\n'
+    yield 'Список необходимых продуктов:\n'
+    for number_of_item, (
+        ingredient, measurement_unit, amount
+    ) in enumerate(ingredients_and_amounts, start=1):
+        yield '{}. {} ({}) — {}\n'.format(
             number_of_item,
             ingredient.capitalize(),
             measurement_unit,
             amount,
         )
-        for number_of_item, (
-            ingredient, measurement_unit, amount
-        ) in enumerate(ingredients_and_amounts, start=1)
-    ]
-
-    recipes_list = [
-        '{}. {}'.format(
+    yield 'Список рецептов:'
+    for number_of_item, recipe in enumerate(recipes, start=1):
+        yield '\n{}. {}'.format(
             number_of_item,
             recipe
         )
-        for number_of_item, recipe in enumerate(
-            recipes, start=1
-        )
-    ]
-
-    return '\n'.join(
-        [
-            'Список покупок пользователя: '
-            f'"{user.first_name} {user.last_name}"',
-            f'Дата: {current_date}',
-            'Список необходимых продуктов:',
-            *ingredients_and_amounts_list,
-            'Список рецептов:',
-            *recipes_list
-        ]
+
+
+class Echo:
+    """Файлоподобный объект, который отдаёт записанное значение."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_csv(ingredients_and_amounts, recipes, user):
+    """Построчно формирует список покупок в формате CSV.
+
+    После продуктов через пустую строку идёт список рецептов
+    со своим заголовком, как в текстовом формате.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in ingredients_and_amounts:
+        yield writer.writerow(row)
+    yield writer.writerow(())
+    yield writer.writerow(('recipe',))
+    for recipe in recipes:
+        yield writer.writerow((recipe,))
+
+
+def shopping_cart_json(ingredients_and_amounts, recipes, user):
+    """По частям формирует список покупок в формате JSON."""
+    full_name, current_date = shopping_cart_header(user)
+    yield '{{"user": {}, "date": {}, "ingredients": ['.format(
+        json.dumps(full_name, ensure_ascii=False),
+        json.dumps(current_date)
     )
+    for number_of_item, (
+        ingredient, measurement_unit, amount
+    ) in enumerate(ingredients_and_amounts):
+        yield '{}{}'.format(
+            ', ' if number_of_item else '',
+            json.dumps(
+                {
+                    'name': ingredient,
+                    'measurement_unit': measurement_unit,
+                    'amount': amount
+                },
+                ensure_ascii=False
+            )
+        )
+    yield '], "recipes": ['
+    for number_of_item, recipe in enumerate(recipes):
+        yield '{}{}'.format(
+            ', ' if number_of_item else '',
+            json.dumps(str(recipe), ensure_ascii=False)
+        )
+    yield ']}'
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'json': (shopping_cart_json, 'application/json'),
+}
@@ -4,20 +4,28 @@
 from django.core.exceptions import ValidationError
 
 
-def ingredients_or_tags_validation(ingredients_or_tags, field_name):
-    """Валидатор продуктов и тегов."""
-    if not ingredients_or_tags:
+def ingredients_or_tags_validation(ids, field_name, queryset):
+    """Валидатор продуктов и тегов.
+
+    Проверяет заполненность и уникальность id, затем загружает все
+    объекты одним запросом и сообщает сразу обо всех несуществующих id.
+    Отдаёт словарь объектов по id.
+    """
+    if not ids:
         raise ValidationError(
             f'Не заполнено поле "{field_name}"!'
         )
 
-    if field_name == 'ingredients':
-        ingredients_or_tags = [ing['id'] for ing in ingredients_or_tags]
-
-    ingredients_or_tags_list = [ing_or_tg for ing_or_tg in ingredients_or_tags]
-    unique_ingredients_or_tags_list = set(ingredients_or_tags_list)
-
-    if len(ingredients_or_tags_list) != len(unique_ingredients_or_tags_list):
+    if len(ids) != len(set(ids)):
         raise ValidationError(
             f'Неуникальные значения в поле "{field_name}"!'
         )
+
+    objects = queryset.in_bulk(ids)
+    missing_ids = [str(pk) for pk in ids if pk not in objects]
+    if missing_ids:
+        raise ValidationError(
+            f'Несуществующие значения в поле "{field_name}": '
+            f'{", ".join(missing_ids)}!'
+        )
+    return objects
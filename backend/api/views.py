@@ -2,31 +2,50 @@
 """Модуль с представлениями приложения API проекта Foodgram."""
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Exists, OuterRef, Prefetch, Value
+)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 from rest_framework.serializers import ValidationError
 
+from recipes.constants import SHORT_LINK_MAX_AGE
+from recipes.locks import lock_users
 from recipes.models import (
-    Favorite, Ingredient,
+    Favorite, ImageStatus, Ingredient,
     Recipe, RecipeIngredient,
-    ShoppingCart, Subscription, Tag
+    ShoppingCart, ShoppingListItem, Subscription, Tag
+)
+from recipes.search import fuzzy_search_ingredients, ingredient_prefix_index
+from recipes.shopping_list import refresh_shopping_list_recipes
+from recipes.short_links import get_short_link_path, recipe_id_cache
+from .constants import (
+    FUZZY_SEARCH_PARAM, SHOPPING_CART_FILENAME,
+    SHOPPING_CART_FORMAT_PARAM, TRUE_VALUES
 )
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import StandardResultsSetPagination
+from .mixins import VersionedReferenceMixin
+from .pagination import RecipePagination, StandardResultsSetPagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (
-    IngredientSerializer, RecipeModificateSerializer,
+    BulkIdsSerializer, IngredientSerializer, RecipeModificateSerializer,
     RecipeSerializer, RecipeShortSerializer,
-    SubscriptionsSerializer, TagSerializer,
-    UserSerializer
+    ShoppingListItemSerializer, SubscriptionsSerializer,
+    TagSerializer, UserSerializer
+)
+from .utils import (
+    SHOPPING_CART_FORMATS, bulk_add_to_delete_from, get_recipes_limit
 )
-from .utils import shopping_cart_content
 
 User = get_user_model()
 
@@ -69,7 +88,9 @@ class UserViewSet(DjoserUserViewSet):
                 raise ValidationError(
                     'У пользователя нет аватара!'
                 )
-            avatar.delete()
+            request.user.avatar = None
+            request.user.avatar_status = ImageStatus.READY
+            request.user.save(update_fields=('avatar', 'avatar_status'))
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         serializer = UserSerializer(
@@ -81,10 +102,36 @@ class UserViewSet(DjoserUserViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(
-            {'avatar': serializer.data.get('avatar')},
+            {
+                'avatar': serializer.data.get('avatar'),
+                'avatar_status': serializer.data.get('avatar_status')
+            },
             status=status.HTTP_200_OK
         )
 
+    def get_subscribed_authors(self):
+        """Отдаёт авторов из подписок текущего пользователя.
+
+        Число рецептов хранится в столбце автора, а первые рецепты
+        каждого автора загружаются одним запросом с оконной функцией
+        ROW_NUMBER() в разрезе автора.
+        """
+        return User.objects.filter(
+            authors__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by(
+            *User._meta.ordering
+        ).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=Recipe.objects.all()[
+                    :get_recipes_limit(self.request)
+                ],
+                to_attr='limited_recipes'
+            )
+        )
+
     @action(
         detail=False,
         methods=['get'],
@@ -95,24 +142,46 @@ class UserViewSet(DjoserUserViewSet):
         return self.get_paginated_response(
             SubscriptionsSerializer(
                 self.paginate_queryset(
-                    User.objects.filter(
-                        authors__user=self.request.user
-                    )
+                    self.get_subscribed_authors()
                 ),
                 many=True,
                 context={'request': request}
             ).data
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='subscribe',
+        url_name='subscribe-list'
+    )
+    def subscribe_list(self, request, *args, **kwargs):
+        """Пакетно добавляет или убирает подписки пользователя."""
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, _ = bulk_add_to_delete_from(
+            request.user,
+            serializer.validated_data['ids'],
+            Subscription,
+            'author',
+            User.objects.all(),
+            forbidden_ids=(request.user.id,),
+            delete=request.method == 'DELETE'
+        )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
         permission_classes=(permissions.IsAuthenticated,)
     )
+    @transaction.atomic
     def subscribe(self, request, *args, **kwargs):
         """Добавляет или убирает подписки пользователя."""
         author = get_object_or_404(User, id=kwargs['user_id'])
         user = request.user
+        lock_users(user.id, author.id)
 
         if request.method == 'DELETE':
             get_object_or_404(
@@ -137,14 +206,14 @@ class UserViewSet(DjoserUserViewSet):
             )
         return Response(
             SubscriptionsSerializer(
-                author,
+                self.get_subscribed_authors().get(id=author.id),
                 context={'request': request}
             ).data,
             status=status.HTTP_201_CREATED
         )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedReferenceMixin, viewsets.ReadOnlyModelViewSet):
     """Представление тегов."""
 
     queryset = Tag.objects.all()
@@ -153,7 +222,10 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    VersionedReferenceMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """Представление продуктов."""
 
     queryset = Ingredient.objects.all()
@@ -162,6 +234,15 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     filterset_class = IngredientFilter
 
+    def get_list_response(self, request, *args, **kwargs):
+        """Отдаёт продукты, при поиске по названию — из индекса в памяти."""
+        name = request.query_params.get('name')
+        if name is None:
+            return super().get_list_response(request, *args, **kwargs)
+        if request.query_params.get(FUZZY_SEARCH_PARAM) in TRUE_VALUES:
+            return Response(fuzzy_search_ingredients(name))
+        return Response(ingredient_prefix_index.search(name))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Представление рецептов."""
@@ -169,20 +250,68 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,
                           permissions.IsAuthenticatedOrReadOnly)
-    pagination_class = StandardResultsSetPagination
+    pagination_class = RecipePagination
     lookup_url_kwarg = 'recipe_id'
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """Отдаёт рецепты, подготовленные для чтения.
+
+        Автор, теги и продукты загружаются заранее, а признаки
+        избранного, списка покупок и подписки на автора вычисляются
+        подзапросами, поэтому число запросов на страницу постоянно.
+        """
+        recipes = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS:
+            return recipes
+        user = self.request.user
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(
+                    Subscription.objects.filter(
+                        user=user,
+                        author=OuterRef('pk')
+                    )
+                )
+            )
+            recipes = recipes.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(
+                        user=user,
+                        recipe=OuterRef('pk')
+                    )
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user,
+                        recipe=OuterRef('pk')
+                    )
+                )
+            )
+        return recipes.prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
     def get_serializer_class(self):
         """Выбирает сериализатор чтения или записи рецепта."""
         if self.request.method in permissions.SAFE_METHODS:
             return RecipeSerializer
         return RecipeModificateSerializer
 
+    @transaction.atomic
     def recipes_add_to_delete_from(self, model):
         """Метод добавления и удаления рецепта в других моделях."""
         recipe = get_object_or_404(Recipe, id=self.kwargs['recipe_id'])
         user = self.request.user
+        lock_users(user.id)
 
         if self.request.method == 'DELETE':
             get_object_or_404(model, user=user, recipe=recipe).delete()
@@ -204,6 +333,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @transaction.atomic
+    def recipes_bulk_add_to_delete_from(self, model):
+        """Метод пакетного добавления и удаления рецептов в других моделях."""
+        serializer = BulkIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        user = self.request.user
+        results, changed_ids = bulk_add_to_delete_from(
+            user,
+            serializer.validated_data['ids'],
+            model,
+            'recipe',
+            Recipe.objects.all(),
+            delete=self.request.method == 'DELETE'
+        )
+        if model is ShoppingCart and changed_ids:
+            refresh_shopping_list_recipes(user.id, changed_ids)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='favorite',
+        url_name='favorite-list'
+    )
+    def favorite_list(self, request, *args, **kwargs):
+        """Пакетно добавляет или убирает рецепты в избранных рецептах."""
+        return self.recipes_bulk_add_to_delete_from(Favorite)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -231,59 +389,103 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_link(self, request, *args, **kwargs):
         """Отдаёт короткую ссылку на текущий рецепт."""
         recipe_id = kwargs['recipe_id']
-        if not Recipe.objects.filter(id=recipe_id).exists():
+        if not (
+            recipe_id.isdigit()
+            and recipe_id_cache.exists(int(recipe_id))
+        ):
             raise ValidationError(
                 f'Рецепта с id "{recipe_id}" не существует!'
             )
-        return Response(
+        response = Response(
             {
                 'short-link': request.build_absolute_uri(
-                    reverse(
-                        'recipes:recipe_short_link',
-                        args=(recipe_id,)
-                    )
+                    get_short_link_path(int(recipe_id))
                 )
             },
             status=status.HTTP_200_OK
         )
+        patch_cache_control(
+            response, public=True, max_age=SHORT_LINK_MAX_AGE
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=['get', 'post', 'delete'],
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='shopping_cart',
+        url_name='shopping-cart-list'
+    )
+    def shopping_cart_list(self, request):
+        """Отдаёт итоги списка покупок или пакетно меняет его рецепты."""
+        if request.method != 'GET':
+            return self.recipes_bulk_add_to_delete_from(ShoppingCart)
+        return Response(
+            ShoppingListItemSerializer(
+                ShoppingListItem.objects.filter(
+                    user=request.user
+                ).select_related(
+                    'ingredient'
+                ).order_by(
+                    'ingredient__name'
+                ),
+                many=True
+            ).data
+        )
 
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=(permissions.IsAuthenticated,)
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(
+            *api_settings.DEFAULT_RENDERER_CLASSES,
+            PlainTextRenderer,
+            CSVRenderer
+        )
     )
     def download_shopping_cart(self, request):
-        """Преобразует данные списка покупок и выгружает их в .txt."""
+        """Выгружает список покупок потоком в .txt, .csv или .json."""
         user = request.user
+        file_format = request.query_params.get(
+            SHOPPING_CART_FORMAT_PARAM,
+            'txt'
+        )
+        if file_format not in SHOPPING_CART_FORMATS:
+            raise ValidationError(
+                f'Формат "{file_format}" не поддерживается!'
+            )
         if not user.shoppingcarts.exists():
             raise ValidationError(
                 'Список покупок пуст!'
             )
         ingredients_and_amounts = (
-            RecipeIngredient.objects.filter(
-                recipe__shoppingcarts__user=user
-            ).values(
-                'ingredient'
-            ).annotate(
-                summarized_amount=Sum('amount')
-            ).order_by(
+            user.shopping_list_items.order_by(
                 'ingredient__name',
             ).values_list(
                 'ingredient__name',
                 'ingredient__measurement_unit',
-                'summarized_amount'
-            )
+                'total_amount'
+            ).iterator()
         )
 
         recipes = Recipe.objects.filter(
             shoppingcarts__user=user
-        ).all().order_by('name',)
+        ).order_by('name',).values_list('name', flat=True).iterator()
 
-        return FileResponse(
-            shopping_cart_content(
+        content, content_type = SHOPPING_CART_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            content(
                 ingredients_and_amounts,
                 recipes,
                 user
             ),
-            content_type='text/plain; utf-8'
+            content_type=content_type
+        )
+        response['Content-Disposition'] = content_disposition_header(
+            as_attachment=True,
+            filename=SHOPPING_CART_FILENAME.format(
+                date=timezone.localdate().isoformat(),
+                format=file_format
+            )
         )
+        return response
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.PerformanceMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,6 +77,17 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+    }
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -109,6 +121,16 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / 'media'
 
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+PERFORMANCE_METRICS = os.getenv('PERFORMANCE_METRICS', '') in (
+    '1', 'true', 'True', 'yes'
+)
+PERFORMANCE_METRICS_DIR = os.getenv(
+    'PERFORMANCE_METRICS_DIR', '/tmp/foodgram_metrics'
+)
+PERFORMANCE_METRICS_TOKEN = os.getenv('PERFORMANCE_METRICS_TOKEN', '')
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -4,13 +4,26 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import Count, Prefetch
 from django.utils.safestring import mark_safe
 
-from .constants import EMPTY_VALUE_DISPLAY
+from .constants import (
+    AVATAR_DERIVATIVES, EMPTY_VALUE_DISPLAY, RECIPE_IMAGE_DERIVATIVES,
+    RECIPE_IMAGE_MAX_SIZE
+)
+from .counters import move_counters
+from .images import enqueue_image, get_derivative_urls
 from .models import (
     Favorite, Ingredient, Recipe,
     RecipeIngredient, ShoppingCart, Subscription, Tag
 )
+from .search import fuzzy_search_ingredients
+from .shopping_list import (
+    get_recipe_ingredient_ids, refresh_recipe_in_shopping_lists,
+    refresh_shopping_list, refresh_shopping_list_recipes,
+    shopping_lists_refreshed_by_caller
+)
 
 User = get_user_model()
 
@@ -26,10 +39,11 @@ class UserAdmin(DjangoUserAdmin):
         'email',
         'thumbnail',
         'recipes_count',
-        'authors_count',
-        'followers_count'
+        'subscriptions_count',
+        'subscribers_count'
     )
     search_fields = ('username', 'email')
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE_DISPLAY
 
     @admin.display(description='ФИО')
@@ -37,33 +51,63 @@ class UserAdmin(DjangoUserAdmin):
         """Отдаёт имя и фамилию пользователя."""
         return f'{user.first_name} {user.last_name}'
 
-    @admin.display(description='Рецептов')
-    def recipes_count(self, user):
-        """Отдает число рецептов пользователя."""
-        return user.recipes.count()
-
-    @admin.display(description='Подписок')
-    def authors_count(self, user):
-        """Отдает число подписок пользователя."""
-        return user.followers.count()
-
-    @admin.display(description='Подписчиков')
-    def followers_count(self, user):
-        """Отдает число подписчиков пользователя."""
-        return user.authors.count()
-
     @admin.display(description='Аватар')
     @mark_safe
     def thumbnail(self, user):
         """Отдаёт миниатюрный аватар пользователя."""
+        if not user.avatar:
+            return ''
+        thumb = get_derivative_urls(user.avatar, AVATAR_DERIVATIVES)['thumb']
         return (
-            f'<img src="{user.avatar.url}" width="75" height="75" />'
-            if user.avatar else ''
+            f'<picture><source srcset="{thumb["webp"]}" type="image/webp">'
+            f'<img src="{thumb["src"]}" width="75" height="75" '
+            f'loading="lazy" /></picture>'
         )
 
 
+class CountersAdminMixin(admin.ModelAdmin):
+    """Родительский класс админок записей, от которых зависят счётчики."""
+
+    def save_model(self, request, obj, form, change):
+        """Переносит счётчики, если в записи сменились внешние ключи."""
+        old = type(obj).objects.get(pk=obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        if old:
+            move_counters(type(obj), old, obj)
+
+
+class ImageQueueAdminMixin(admin.ModelAdmin):
+    """Родительский класс админок, загружающих изображения.
+
+    Загруженный файл, как и в API, не сохраняется в поле напрямую,
+    а ставится в очередь: обработчик поворачивает и пережимает его
+    и создаёт производные изображения.
+    """
+
+    # {поле изображения: наибольшая сторона после обработки}
+    image_fields = {}
+
+    def save_model(self, request, obj, form, change):
+        """Сохраняет запись с прежним изображением и ставит новое в очередь."""
+        uploaded_files = {}
+        for field in self.image_fields:
+            uploaded_file = form.cleaned_data.get(field)
+            if field in form.changed_data and isinstance(
+                uploaded_file, UploadedFile
+            ):
+                uploaded_files[field] = uploaded_file
+                setattr(
+                    obj, field, getattr(form.initial.get(field), 'name', None)
+                )
+        super().save_model(request, obj, form, change)
+        for field, uploaded_file in uploaded_files.items():
+            enqueue_image(
+                obj, field, uploaded_file, self.image_fields[field]
+            )
+
+
 @admin.register(Subscription)
-class SubcsriptionAdmin(admin.ModelAdmin):
+class SubcsriptionAdmin(CountersAdminMixin):
     """Админка подписок."""
 
     list_display = (
@@ -71,9 +115,15 @@ class SubcsriptionAdmin(admin.ModelAdmin):
         'user',
         'author'
     )
-    search_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE_DISPLAY
 
+    def get_queryset(self, request):
+        """Загружает подписчика и автора вместе с подпиской."""
+        return super().get_queryset(request).select_related('user', 'author')
+
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -83,10 +133,16 @@ class TagAdmin(admin.ModelAdmin):
     search_fields = ('name', 'slug')
     empty_value_display = EMPTY_VALUE_DISPLAY
 
-    @admin.display(description='Рецептов')
+    def get_queryset(self, request):
+        """Добавляет к тегам число рецептов."""
+        return super().get_queryset(request).annotate(
+            recipe_count=Count('recipes', distinct=True)
+        )
+
+    @admin.display(description='Рецептов', ordering='recipe_count')
     def recipe_count(self, tag):
-        """Отдает число рецептов с продуктом."""
-        return tag.recipes.count()
+        """Отдает число рецептов с тегом."""
+        return tag.recipe_count
 
 
 @admin.register(Ingredient)
@@ -99,13 +155,40 @@ class IngredientAdmin(admin.ModelAdmin):
         'recipe_count'
     )
     list_filter = ('measurement_unit',)
-    search_fields = ('name', 'measurement_unit')
+    search_fields = ('name',)
+    ordering = Ingredient._meta.ordering
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE_DISPLAY
 
-    @admin.display(description='Рецептов')
+    def get_queryset(self, request):
+        """Добавляет к продуктам число рецептов."""
+        return super().get_queryset(request).annotate(
+            recipe_count=Count('recipes', distinct=True)
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет продукты по вхождению строки и с опечатками.
+
+        Используется и в списке продуктов, и в автодополнении полей
+        продукта. К обычному поиску по search_fields добавляются
+        не больше FUZZY_SEARCH_LIMIT продуктов нечёткого поиска.
+        """
+        results, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        if not search_term:
+            return results, may_have_duplicates
+        return results | queryset.filter(
+            pk__in=[
+                ingredient['id']
+                for ingredient in fuzzy_search_ingredients(search_term)
+            ]
+        ), may_have_duplicates
+
+    @admin.display(description='Рецептов', ordering='recipe_count')
     def recipe_count(self, ingredient):
         """Отдает число рецептов с продуктом."""
-        return ingredient.recipes.count()
+        return ingredient.recipe_count
 
 
 @admin.register(RecipeIngredient)
@@ -117,10 +200,57 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         'recipe', '_measurement_unit',
         'amount'
     )
-    search_fields = ('ingredient', 'recipe')
+    search_fields = ('ingredient__name', 'recipe__name')
+    autocomplete_fields = ('ingredient', 'recipe')
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE_DISPLAY
 
-    @admin.display(description='Ед.изм')
+    def get_queryset(self, request):
+        """Загружает продукт и рецепт вместе с записью."""
+        return super().get_queryset(request).select_related(
+            'ingredient', 'recipe'
+        )
+
+    def save_model(self, request, recipe_ingredient, form, change):
+        """Пересчитывает списки покупок до и после правки записи."""
+        old = (
+            RecipeIngredient.objects.get(pk=recipe_ingredient.pk)
+            if change else None
+        )
+        super().save_model(request, recipe_ingredient, form, change)
+        if old and old.recipe_id != recipe_ingredient.recipe_id:
+            refresh_recipe_in_shopping_lists(
+                old.recipe_id, (old.ingredient_id,)
+            )
+        refresh_recipe_in_shopping_lists(
+            recipe_ingredient.recipe_id,
+            {recipe_ingredient.ingredient_id}
+            | ({old.ingredient_id} if old else set())
+        )
+
+    def delete_model(self, request, recipe_ingredient):
+        """Пересчитывает списки покупок после удаления записи."""
+        super().delete_model(request, recipe_ingredient)
+        refresh_recipe_in_shopping_lists(
+            recipe_ingredient.recipe_id,
+            (recipe_ingredient.ingredient_id,)
+        )
+
+    def delete_queryset(self, request, queryset):
+        """Пересчитывает списки покупок после удаления записей."""
+        rows = list(queryset.values_list('recipe', 'ingredient'))
+        super().delete_queryset(request, queryset)
+        refresh_shopping_list(
+            ShoppingCart.objects.filter(
+                recipe__in={recipe_id for recipe_id, _ in rows}
+            ).values_list('user', flat=True),
+            {ingredient_id for _, ingredient_id in rows}
+        )
+
+    @admin.display(
+        description='Ед.изм',
+        ordering='ingredient__measurement_unit'
+    )
     def _measurement_unit(self, recipe_ingredient):
         """Отдаёт единицу измерения продукта."""
         return recipe_ingredient.ingredient.measurement_unit
@@ -130,14 +260,21 @@ class FavShopCartAdminMixin(admin.ModelAdmin):
     """Родительский класс админок избранного и корзины."""
 
     list_display = ('id', 'user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE_DISPLAY
 
     class Meta:
         abstract = True
 
+    def get_queryset(self, request):
+        """Загружает пользователя и рецепт вместе с записью."""
+        return super().get_queryset(request).select_related('user', 'recipe')
+
 
 @admin.register(Favorite)
-class FavoriteAdmin(FavShopCartAdminMixin):
+class FavoriteAdmin(CountersAdminMixin, FavShopCartAdminMixin):
     """Админка избранных рецептов."""
 
 
@@ -145,13 +282,45 @@ class FavoriteAdmin(FavShopCartAdminMixin):
 class ShoppingCartAdmin(FavShopCartAdminMixin):
     """Админка списков покупок."""
 
+    def save_model(self, request, shopping_cart, form, change):
+        """Пересчитывает прежний список покупок после правки записи.
+
+        Новый список пересчитывает сигнал сохранения записи.
+        """
+        old = (
+            ShoppingCart.objects.get(pk=shopping_cart.pk)
+            if change else None
+        )
+        super().save_model(request, shopping_cart, form, change)
+        if old and (old.user_id, old.recipe_id) != (
+            shopping_cart.user_id, shopping_cart.recipe_id
+        ):
+            refresh_shopping_list_recipes(old.user_id, (old.recipe_id,))
+
+    def delete_queryset(self, request, queryset):
+        """Пересчитывает списки покупок после удаления записей."""
+        rows = list(queryset.values_list('user', 'recipe'))
+        with shopping_lists_refreshed_by_caller():
+            super().delete_queryset(request, queryset)
+        refresh_shopping_list(
+            {user_id for user_id, _ in rows},
+            get_recipe_ingredient_ids(
+                *{recipe_id for _, recipe_id in rows}
+            )
+        )
+
 
 class RecipeIngredientInline(admin.TabularInline):
     """Определение встраиваемых продуктов в рецепте."""
 
     model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
     readonly_fields = ('_measurement_unit',)
 
+    def get_queryset(self, request):
+        """Загружает продукты рецепта одним запросом."""
+        return super().get_queryset(request).select_related('ingredient')
+
     @admin.display(description='Ед.изм')
     def _measurement_unit(self, recipe_ingredient):
         """Отдаёт единицу измерения продукта."""
@@ -159,19 +328,45 @@ class RecipeIngredientInline(admin.TabularInline):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ImageQueueAdminMixin, CountersAdminMixin):
     """Админка рецептов."""
 
     list_display = (
         'id', 'author', 'name',
         'thumbnail', 'cooking_time',
         '_tags', '_ingredients',
-        'fav_count'
+        'favorites_count'
     )
     inlines = (RecipeIngredientInline,)
-    list_filter = ('tags', 'author')
-    search_fields = ('name', 'author')
+    list_filter = ('tags',)
+    search_fields = ('name', 'author__username')
+    ordering = Recipe._meta.ordering
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE_DISPLAY
+    image_fields = {'image': RECIPE_IMAGE_MAX_SIZE}
+
+    def get_queryset(self, request):
+        """Загружает автора, теги и продукты рецептов."""
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def save_related(self, request, form, formsets, change):
+        """Пересчитывает списки покупок после правки продуктов рецепта."""
+        recipe = form.instance
+        old_ingredient_ids = get_recipe_ingredient_ids(recipe)
+        super().save_related(request, form, formsets, change)
+        refresh_recipe_in_shopping_lists(
+            recipe,
+            old_ingredient_ids | get_recipe_ingredient_ids(recipe)
+        )
 
     @admin.display(description='Теги')
     @mark_safe
@@ -197,15 +392,16 @@ class RecipeAdmin(admin.ModelAdmin):
     @mark_safe
     def thumbnail(self, recipe):
         """Отдаёт миниатюрное изображение рецепта."""
+        if not recipe.image:
+            return ''
+        thumb = get_derivative_urls(
+            recipe.image, RECIPE_IMAGE_DERIVATIVES
+        )['thumb']
         return (
-            f'<img src="{recipe.image.url}" width="75" height="75" />'
-            if recipe.image else ''
+            f'<picture><source srcset="{thumb["webp"]}" type="image/webp">'
+            f'<img src="{thumb["src"]}" width="75" height="75" '
+            f'loading="lazy" /></picture>'
         )
 
-    @admin.display(description='В избранном')
-    def fav_count(self, recipe):
-        """Отдаёт кол-во добавлений в избранное для рецепта."""
-        return recipe.favorites.count()
-
 
 admin.site.unregister(Group)
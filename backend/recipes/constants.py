@@ -10,7 +10,64 @@ DEFAULT_USERNAME_FIELD = 'email'
 DEFAULT_REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 USERNAME_REG_EX = r'^[\w.@+-]+\Z'
 
+# Константы справочных данных.
+REFERENCE_VERSION_KEY = 'reference_version:{}'
+
+# Константы поиска продуктов с опечатками.
+FUZZY_SEARCH_LIMIT = 10
+FUZZY_SEARCH_MIN_SIMILARITY = 0.15
+FUZZY_SEARCH_CANDIDATES = 200
+FUZZY_SEARCH_MAX_POSTINGS = 20000
+
+# Константы обработки изображений.
+RECIPE_IMAGE_MAX_SIZE = 1600
+AVATAR_MAX_SIZE = 512
+IMAGE_JPEG_QUALITY = 85
+IMAGE_JOB_STALE_SECONDS = 600
+IMAGE_WEBP_QUALITY = 80
+IMAGE_SOURCE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif', 'webp')
+# Форматы, в которых производные пишутся с расширением исходника.
+IMAGE_DERIVATIVE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'webp')
+IMAGE_DERIVATIVE_FALLBACK_EXTENSION = 'png'
+CONTENT_HASH_PREFIX_LENGTH = 2
+MEDIA_GC_MIN_AGE_SECONDS = 3600
+# Производные размеры изображений: {имя: наибольшая сторона}.
+RECIPE_IMAGE_DERIVATIVES = {'thumb': 150, 'card': 480}
+AVATAR_DERIVATIVES = {'thumb': 75, 'avatar': 160}
+IMAGE_DERIVATIVES = {
+    'recipes.recipe.image': RECIPE_IMAGE_DERIVATIVES,
+    'recipes.user.avatar': AVATAR_DERIVATIVES,
+}
+
 # Константы рецептов.
 # Константы валидации.
 MIN_COOKING_TIME = 1
 MIN_AMOUNT = 1
+
+# Константы полнотекстового поиска рецептов.
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_TABLE = 'recipes_recipe_fts'
+# Во сколько раз совпадение в названии весомее совпадения в тексте (FTS5).
+RECIPE_SEARCH_NAME_WEIGHT = 10.0
+
+# Константы коротких ссылок.
+SHORT_LINK_ALPHABET = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+SHORT_LINK_LENGTH = 7
+SHORT_LINK_BITS = 40
+# Нечётный множитель и маска перемешивания id: менять нельзя,
+# иначе перестанут открываться уже выданные ссылки.
+SHORT_LINK_MULTIPLIER = 0x9E3779B97
+SHORT_LINK_MASK = 0x5DEECE66D
+SHORT_LINK_MAX_AGE = 24 * 60 * 60
+# Сколько проверок существования рецептов хранить в памяти процесса.
+RECIPE_ID_CACHE_SIZE = 10000
+
+# Константы импорта данных.
+IMPORT_BATCH_SIZE = 1000
+IMPORT_READ_CHUNK_SIZE = 64 * 1024
+IMPORT_CHECKPOINT_SUFFIX = '.checkpoint'
+RECIPE_TRANSFER_CHUNK_SIZE = 500
+FIXTURES_BATCH_SIZE = 5000
+FIXTURES_UPDATE_BATCH_SIZE = 500
@@ -0,0 +1,15 @@
+"""Модуль с конвертерами адресов приложения рецептов проекта Foodgram."""
+
+from .constants import SHORT_LINK_LENGTH
+
+
+class ShortCodeConverter:
+    """Конвертер кода короткой ссылки на рецепт."""
+
+    regex = f'[0-9a-zA-Z]{{{SHORT_LINK_LENGTH}}}'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
@@ -0,0 +1,125 @@
+"""Модуль со счётчиками рецептов и пользователей проекта Foodgram.
+
+Число рецептов автора, подписок и подписчиков пользователя
+и добавлений рецепта в избранное хранятся в столбцах и меняются
+атомарными UPDATE с F() в той же транзакции, что и сама запись.
+Расхождения исправляет команда recount.
+"""
+
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, Subscription, User
+
+# {модель записи: ((внешний ключ, модель счётчика, поле счётчика), ...)}
+COUNTERS = {
+    Recipe: (
+        ('author', User, 'recipes_count'),
+    ),
+    Favorite: (
+        ('recipe', Recipe, 'favorites_count'),
+    ),
+    Subscription: (
+        ('user', User, 'subscriptions_count'),
+        ('author', User, 'subscribers_count'),
+    ),
+}
+
+local = threading.local()
+
+
+@contextmanager
+def counters_changed_by_caller():
+    """Отключает сигналы счётчиков: вызывающий код меняет их сам.
+
+    Нужен для пакетного удаления, чтобы вместо UPDATE на каждую
+    удалённую запись счётчики менялись одним запросом на приращение.
+    """
+    local.disabled = True
+    try:
+        yield
+    finally:
+        local.disabled = False
+
+
+def counter_signals_enabled():
+    """Проверяет, должны ли сигналы менять счётчики."""
+    return not getattr(local, 'disabled', False)
+
+
+def change_counters(model, instances, sign=1):
+    """Меняет счётчики объектов, на которые ссылаются записи модели.
+
+    Объекты с одинаковым приращением обновляются одним запросом.
+    """
+    for foreign_key, counter_model, field in COUNTERS[model]:
+        deltas = Counter(
+            getattr(instance, f'{foreign_key}_id') for instance in instances
+        )
+        pks_by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            pks_by_delta[delta * sign].append(pk)
+        for delta, pks in pks_by_delta.items():
+            counter_model.objects.filter(pk__in=pks).update(
+                **{field: F(field) + delta}
+            )
+
+
+def move_counters(model, old, new):
+    """Переносит счётчики при смене внешних ключей записи."""
+    for foreign_key, counter_model, field in COUNTERS[model]:
+        old_pk = getattr(old, f'{foreign_key}_id')
+        new_pk = getattr(new, f'{foreign_key}_id')
+        if old_pk != new_pk:
+            counter_model.objects.filter(pk=old_pk).update(
+                **{field: F(field) - 1}
+            )
+            counter_model.objects.filter(pk=new_pk).update(
+                **{field: F(field) + 1}
+            )
+
+
+def get_actual_count(model, foreign_key):
+    """Отдаёт подзапрос с числом записей модели для объекта счётчика."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{foreign_key: OuterRef('pk')}
+            ).order_by().values(foreign_key).annotate(
+                count=Count('pk')
+            ).values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount_counters(pks_by_model, dry_run=False):
+    """Сверяет счётчики объектов с данными и исправляет расхождения.
+
+    Отдаёт число исправленных (при dry_run — найденных) значений.
+    """
+    drifted = 0
+    for model, counters in COUNTERS.items():
+        for foreign_key, counter_model, field in counters:
+            pks = pks_by_model.get(counter_model)
+            if not pks:
+                continue
+            actual = get_actual_count(model, foreign_key)
+            drifted_pks = list(
+                counter_model.objects.filter(pk__in=pks).annotate(
+                    actual=actual
+                ).exclude(
+                    **{field: F('actual')}
+                ).values_list('pk', flat=True)
+            )
+            drifted += len(drifted_pks)
+            if drifted_pks and not dry_run:
+                counter_model.objects.filter(pk__in=drifted_pks).update(
+                    **{field: actual}
+                )
+    return drifted
@@ -0,0 +1,125 @@
+"""Модуль с полнотекстовым поиском рецептов проекта Foodgram.
+
+В PostgreSQL рецепты ищутся по вычисляемому столбцу search_vector
+с GIN-индексом, который создаёт миграция. В SQLite для локальной
+разработки используется виртуальная таблица FTS5 с триггерами:
+её создаёт обработчик post_migrate, потому что SQLite пересоздаёт
+таблицу рецептов при изменении схемы и теряет триггеры. В обоих
+случаях индекс обновляет сама база при записи рецепта.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from .constants import (
+    RECIPE_SEARCH_CONFIG, RECIPE_SEARCH_NAME_WEIGHT, RECIPE_SEARCH_TABLE
+)
+from .models import Recipe
+
+WORD_REG_EX = re.compile(r'\w+')
+
+SQLITE_SEARCH_TRIGGERS = {
+    f'{RECIPE_SEARCH_TABLE}_insert': '''
+        AFTER INSERT ON {recipes} BEGIN
+            INSERT INTO {search}(rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END
+    ''',
+    f'{RECIPE_SEARCH_TABLE}_delete': '''
+        AFTER DELETE ON {recipes} BEGIN
+            INSERT INTO {search}({search}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+        END
+    ''',
+    f'{RECIPE_SEARCH_TABLE}_update': '''
+        AFTER UPDATE OF name, text ON {recipes} BEGIN
+            INSERT INTO {search}({search}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+            INSERT INTO {search}(rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END
+    ''',
+}
+
+
+def ensure_sqlite_search_index(connection):
+    """Создаёт таблицу FTS5 и триггеры, если их нет, и заполняет её."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)',
+            (RECIPE_SEARCH_TABLE, *SQLITE_SEARCH_TRIGGERS)
+        )
+        if len(cursor.fetchall()) == len(SQLITE_SEARCH_TRIGGERS) + 1:
+            return
+        names = {
+            'recipes': Recipe._meta.db_table,
+            'search': RECIPE_SEARCH_TABLE,
+        }
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {RECIPE_SEARCH_TABLE} '
+            f"USING fts5(name, text, content='{names['recipes']}', "
+            "content_rowid='id')"
+        )
+        for trigger, body in SQLITE_SEARCH_TRIGGERS.items():
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {trigger} '
+                + body.format(**names)
+            )
+        cursor.execute(
+            f'INSERT INTO {RECIPE_SEARCH_TABLE}({RECIPE_SEARCH_TABLE}) '
+            "VALUES ('rebuild')"
+        )
+
+
+def get_search_expressions(vendor, query):
+    """Отдаёт условие совпадения и ранг рецепта для запроса."""
+    recipes = Recipe._meta.db_table
+    if vendor == 'postgresql':
+        ts_query = 'websearch_to_tsquery(%s, %s)'
+        params = (RECIPE_SEARCH_CONFIG, query)
+        return (
+            RawSQL(
+                f'{recipes}.search_vector @@ {ts_query}',
+                params,
+                output_field=BooleanField()
+            ),
+            RawSQL(
+                f'ts_rank({recipes}.search_vector, {ts_query})',
+                params,
+                output_field=FloatField()
+            )
+        )
+    fts_query = ' '.join(
+        f'"{word}"*' for word in WORD_REG_EX.findall(query)
+    )
+    return (
+        RawSQL(
+            f'{recipes}.id IN (SELECT rowid FROM {RECIPE_SEARCH_TABLE} '
+            f'WHERE {RECIPE_SEARCH_TABLE} MATCH %s)',
+            (fts_query,),
+            output_field=BooleanField()
+        ),
+        RawSQL(
+            f'(SELECT -bm25({RECIPE_SEARCH_TABLE}, %s, 1.0) '
+            f'FROM {RECIPE_SEARCH_TABLE} '
+            f'WHERE {RECIPE_SEARCH_TABLE} MATCH %s '
+            f'AND rowid = {recipes}.id)',
+            (RECIPE_SEARCH_NAME_WEIGHT, fts_query),
+            output_field=FloatField()
+        )
+    )
+
+
+def search_recipes(recipes, query):
+    """Отбирает рецепты по названию и тексту и сортирует по рангу."""
+    if not WORD_REG_EX.search(query):
+        return recipes.none()
+    match, rank = get_search_expressions(
+        connections[recipes.db].vendor, query
+    )
+    return recipes.filter(match).annotate(
+        search_rank=rank
+    ).order_by('-search_rank', *Recipe._meta.ordering)
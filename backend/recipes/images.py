@@ -0,0 +1,317 @@
+"""Модуль с фоновой обработкой изображений проекта Foodgram.
+
+Запрос только сохраняет исходный файл и ставит задание в очередь
+в базе данных. Задания выполняет пул потоков текущего процесса сразу
+после фиксации транзакции, а также команда process_images, которая
+подбирает задания, оставшиеся после перезапуска процессов.
+"""
+
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .constants import (
+    IMAGE_DERIVATIVE_EXTENSIONS, IMAGE_DERIVATIVE_FALLBACK_EXTENSION,
+    IMAGE_DERIVATIVES, IMAGE_JOB_STALE_SECONDS, IMAGE_JPEG_QUALITY,
+    IMAGE_SOURCE_EXTENSIONS, IMAGE_WEBP_QUALITY
+)
+from .models import ImageJob, ImageStatus
+
+logger = logging.getLogger(__name__)
+
+executor = None
+executor_lock = Lock()
+
+
+def normalize_image(source, max_size):
+    """Поворачивает изображение по EXIF и уменьшает его."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+        has_alpha = (
+            image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info
+        )
+        return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def encode_image(image, extension):
+    """Пересжимает изображение в формат по расширению файла."""
+    output = io.BytesIO()
+    if extension == 'webp':
+        image.save(output, 'WEBP', quality=IMAGE_WEBP_QUALITY, method=4)
+    elif extension == 'png':
+        image.save(output, 'PNG', optimize=True)
+    else:
+        image.save(
+            output,
+            'JPEG',
+            quality=IMAGE_JPEG_QUALITY,
+            optimize=True,
+            progressive=True
+        )
+    return output.getvalue()
+
+
+def get_image_extension(image):
+    """Отдаёт расширение, в котором хранится изображение."""
+    return 'png' if image.mode == 'RGBA' else 'jpg'
+
+
+def get_derivative_sizes(model, field):
+    """Отдаёт производные размеры для поля изображения модели."""
+    return IMAGE_DERIVATIVES.get(f'{model}.{field}', {})
+
+
+def get_derivative_name(name, size, extension):
+    """Отдаёт имя файла производного изображения."""
+    directory, filename = os.path.split(name)
+    return os.path.join(
+        directory,
+        'derivatives',
+        f'{os.path.splitext(filename)[0]}_{size}.{extension}'
+    )
+
+
+def get_derivative_source_names(name):
+    """Отдаёт возможные имена исходного файла производного изображения."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0].rsplit('_', 1)[0]
+    return [
+        os.path.join(os.path.dirname(directory), f'{stem}.{extension}')
+        for extension in IMAGE_SOURCE_EXTENSIONS
+    ]
+
+
+def get_derivative_extensions(name):
+    """Отдаёт форматы производных изображений: исходный и WebP.
+
+    Исходник в формате, который не пересжимается (например, GIF),
+    получает производные в PNG.
+    """
+    extension = os.path.splitext(name)[1].lstrip('.').lower()
+    if extension not in IMAGE_DERIVATIVE_EXTENSIONS:
+        extension = IMAGE_DERIVATIVE_FALLBACK_EXTENSION
+    return (extension, 'webp')
+
+
+def save_derivatives(storage, name, image, sizes, overwrite=False):
+    """Сохраняет уменьшенные копии изображения в исходном формате и WebP."""
+    for size, max_side in sizes.items():
+        derivative = image.copy()
+        derivative.thumbnail((max_side, max_side))
+        for extension in get_derivative_extensions(name):
+            derivative_name = get_derivative_name(name, size, extension)
+            if storage.exists(derivative_name):
+                if not overwrite:
+                    continue
+                storage.delete(derivative_name)
+            storage.save_as(
+                derivative_name,
+                ContentFile(encode_image(derivative, extension))
+            )
+
+
+def generate_derivatives(field_file, sizes, overwrite=False):
+    """Создаёт производные изображения для уже сохранённого файла.
+
+    Изображение готовится так же, как в обработчике очереди:
+    поворачивается по EXIF и приводится к RGB или RGBA.
+    Отдаёт False, если все копии уже есть и файл не открывался.
+    """
+    storage = field_file.storage
+    if not overwrite and all(
+        storage.exists(get_derivative_name(field_file.name, size, extension))
+        for size in sizes
+        for extension in get_derivative_extensions(field_file.name)
+    ):
+        return False
+    with field_file.open('rb') as source:
+        image = normalize_image(source, max(sizes.values()))
+    save_derivatives(
+        storage,
+        field_file.name,
+        image,
+        sizes,
+        overwrite=overwrite
+    )
+    return True
+
+
+def get_derivative_urls(field_file, sizes):
+    """Отдаёт адреса производных изображений по размерам."""
+    if not field_file:
+        return None
+    storage = field_file.storage
+    extension, *_ = get_derivative_extensions(field_file.name)
+    return {
+        size: {
+            'width': max_side,
+            'src': storage.url(
+                get_derivative_name(field_file.name, size, extension)
+            ),
+            'webp': storage.url(
+                get_derivative_name(field_file.name, size, 'webp')
+            )
+        }
+        for size, max_side in sizes.items()
+    }
+
+
+def get_status_field(field):
+    """Отдаёт имя поля с состоянием обработки изображения."""
+    return f'{field}_status'
+
+
+def enqueue_image(instance, field, uploaded_file, max_size):
+    """Ставит загруженное изображение в очередь на обработку."""
+    model = instance._meta.label_lower
+    with transaction.atomic():
+        for outdated_job in ImageJob.objects.filter(
+            model=model,
+            object_id=instance.pk,
+            field=field,
+            status__in=(ImageJob.Status.PENDING, ImageJob.Status.FAILED)
+        ):
+            outdated_job.source.delete(save=False)
+            outdated_job.delete()
+        job = ImageJob(
+            model=model,
+            object_id=instance.pk,
+            field=field,
+            max_size=max_size
+        )
+        job.source.save(uploaded_file.name, uploaded_file, save=False)
+        uploaded_file.close()
+        job.save()
+        setattr(instance, get_status_field(field), ImageStatus.PENDING)
+        type(instance).objects.filter(pk=instance.pk).update(
+            **{get_status_field(field): ImageStatus.PENDING}
+        )
+        transaction.on_commit(lambda: submit_image_job(job.pk))
+    return job
+
+
+def submit_image_job(job_id):
+    """Передаёт задание пулу потоков процесса, если он включён.
+
+    Если передать задание не удалось, оно остаётся в очереди
+    для команды process_images.
+    """
+    global executor
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        return
+    try:
+        with executor_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                    thread_name_prefix='image'
+                )
+        executor.submit(run_image_job, job_id)
+    except RuntimeError:
+        logger.exception('Не удалось запустить обработку #%s', job_id)
+
+
+def run_image_job(job_id):
+    """Выполняет задание в потоке пула и закрывает его соединение с БД."""
+    try:
+        process_image_job(job_id)
+    except Exception:
+        logger.exception('Ошибка обработки изображения #%s', job_id)
+    finally:
+        close_old_connections()
+
+
+def claim_image_job(job_id):
+    """Захватывает задание, чтобы его не обработали дважды."""
+    return ImageJob.objects.filter(
+        pk=job_id,
+        status=ImageJob.Status.PENDING
+    ).update(
+        status=ImageJob.Status.PROCESSING,
+        started_at=timezone.now()
+    )
+
+
+def process_image_job(job_id):
+    """Обрабатывает изображение и записывает его в объект.
+
+    Отдаёт True, если задание было выполнено этим вызовом.
+    """
+    if not claim_image_job(job_id):
+        return False
+    job = ImageJob.objects.get(pk=job_id)
+    model = apps.get_model(job.model)
+    status_field = get_status_field(job.field)
+    try:
+        with job.source.open('rb') as source:
+            image = normalize_image(source, job.max_size)
+        extension = get_image_extension(image)
+        content = encode_image(image, extension)
+    except Exception as error:
+        job.status = ImageJob.Status.FAILED
+        job.error = str(error)
+        job.save(update_fields=('status', 'error'))
+        model.objects.filter(pk=job.object_id).update(
+            **{status_field: ImageStatus.FAILED}
+        )
+        return True
+    instance = model.objects.filter(pk=job.object_id).first()
+    superseded = ImageJob.objects.filter(
+        model=job.model,
+        object_id=job.object_id,
+        field=job.field,
+        pk__gt=job.pk
+    ).exists()
+    if instance is not None and not superseded:
+        field_file = getattr(instance, job.field)
+        field_file.save(
+            f'{uuid.uuid4()}.{extension}',
+            ContentFile(content),
+            save=False
+        )
+        save_derivatives(
+            field_file.storage,
+            field_file.name,
+            image,
+            get_derivative_sizes(job.model, job.field)
+        )
+        model.objects.filter(pk=job.object_id).update(
+            **{job.field: field_file.name, status_field: ImageStatus.READY}
+        )
+    job.source.delete(save=False)
+    job.delete()
+    return True
+
+
+def requeue_stale_image_jobs():
+    """Возвращает в очередь задания, зависшие после падения процесса."""
+    return ImageJob.objects.filter(
+        status=ImageJob.Status.PROCESSING,
+        started_at__lt=(
+            timezone.now() - timedelta(seconds=IMAGE_JOB_STALE_SECONDS)
+        )
+    ).update(status=ImageJob.Status.PENDING)
+
+
+def process_pending_image_jobs(limit=None):
+    """Обрабатывает задания из очереди и отдаёт их число."""
+    requeue_stale_image_jobs()
+    job_ids = ImageJob.objects.filter(
+        status=ImageJob.Status.PENDING
+    ).values_list('id', flat=True)
+    if limit:
+        job_ids = job_ids[:limit]
+    return sum(process_image_job(job_id) for job_id in list(job_ids))
@@ -0,0 +1,23 @@
+"""Модуль с блокировками записей пользователей проекта Foodgram.
+
+Избранное, корзина, подписки, их счётчики и итоги списка покупок
+меняются под блокировкой строки пользователя. Поэтому встречные
+запросы одного пользователя выполняются по очереди и видят
+результат друг друга. В SQLite запись в базу и так идёт по очереди,
+и блокировка строк не нужна.
+"""
+
+from .models import User
+
+
+def lock_users(*user_ids):
+    """Блокирует строки пользователей до конца текущей транзакции.
+
+    Строки блокируются в порядке id, чтобы встречные подписки двух
+    пользователей друг на друга не приводили к взаимной блокировке.
+    """
+    list(
+        User.objects.select_for_update().filter(
+            pk__in=user_ids
+        ).order_by('pk').values_list('pk', flat=True)
+    )
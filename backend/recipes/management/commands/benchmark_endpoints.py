@@ -0,0 +1,419 @@
+"""Модуль с определением команды manage.py для замера эндпоинтов."""
+
+import json
+import re
+import time
+from itertools import combinations
+from statistics import quantiles
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag, User
+from recipes.short_links import get_short_link_path
+
+POSTMAN_VARIABLE = re.compile(r'{{(\w+)}}')
+
+
+class QueryCounter:
+    """Считает SQL-запросы соединения через execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_percentiles(timings):
+    """Отдаёт p50, p95 и p99 замеров в миллисекундах."""
+    if len(timings) == 1:
+        return timings * 3
+    cut_points = quantiles(timings, n=100, method='inclusive')
+    return cut_points[49], cut_points[94], cut_points[98]
+
+
+def load_budgets(path):
+    """Читает бюджеты эндпоинтов или результаты прошлого замера."""
+    with open(path, encoding='utf-8') as file:
+        budgets = json.load(file)
+    return budgets.get('endpoints', budgets)
+
+
+def iter_postman_requests(items, variables, auth=None, folder=''):
+    """Отдаёт GET-запросы коллекции Postman с подставленными переменными.
+
+    Запросы на изменение не воспроизводятся, чтобы не менять данные.
+    Запросы с неизвестными переменными пропускаются.
+    """
+    for item in items:
+        item_auth = item.get('auth', auth)
+        name = f'{folder}/{item["name"]}' if folder else item['name']
+        if 'item' in item:
+            yield from iter_postman_requests(
+                item['item'], variables, item_auth, name
+            )
+            continue
+        request = item['request']
+        request_auth = request.get('auth', item_auth)
+        url = request['url']
+        url = url['raw'] if isinstance(url, dict) else url
+        if request['method'] != 'GET' or not all(
+            variable in variables
+            for variable in POSTMAN_VARIABLE.findall(url)
+        ):
+            continue
+        yield (
+            f'postman:{name}',
+            POSTMAN_VARIABLE.sub(
+                lambda match: str(variables[match[1]]), url
+            ),
+            'user' if request_auth and request_auth['type'] != 'noauth'
+            else None
+        )
+
+
+class Command(BaseCommand):
+    """Команда замера задержек и числа SQL-запросов эндпоинтов.
+
+    Запросы выполняются в процессе через тестовый клиент Django
+    на текущих данных, например созданных generate_fixtures.
+    Всё выполняется в транзакции, которая откатывается в конце,
+    поэтому временные токен и администратор в базе не остаются.
+    Фиксации внутри неё не происходит, поэтому функции on_commit,
+    отложенные запросом, выполняются сразу после него, как в тестах
+    с captureOnCommitCallbacks, и входят в его замер.
+    Ответ со статусом 400 и выше или, для запросов из --replay,
+    со статусом, отличным от ожидаемого, считается нарушением.
+    """
+
+    help = 'Замер задержек и числа SQL-запросов эндпоинтов API и админки.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs', type=int, default=20,
+            help='Число замеров каждого эндпоинта.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Число прогревочных запросов без замера.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя, от которого идут запросы.'
+        )
+        parser.add_argument(
+            '--postman',
+            help='Путь к коллекции Postman, GET-запросы которой замерить.'
+        )
+        parser.add_argument(
+            '--replay',
+            help=(
+                'Путь к файлу JSON Lines с запросами: name, path, auth '
+                'и ожидаемый status.'
+            )
+        )
+        parser.add_argument(
+            '--only',
+            help='Замерять только эндпоинты, в имени которых есть строка.'
+        )
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Путь к файлу результатов JSON, "-" для вывода в консоль.'
+        )
+        parser.add_argument(
+            '--budgets',
+            help='Путь к бюджетам эндпоинтов или к прошлым результатам.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимое превышение бюджета задержки p95, доля.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.expected_statuses = {}
+        with transaction.atomic():
+            results = self.run_benchmark()
+            transaction.set_rollback(True)
+        report = {
+            'database': connection.vendor,
+            'runs': options['runs'],
+            'endpoints': results
+        }
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+        violations = self.get_status_violations(results)
+        if options['budgets']:
+            violations += self.get_budget_violations(
+                results, load_budgets(options['budgets'])
+            )
+        if violations:
+            raise CommandError(
+                'Нарушения на эндпоинтах:\n' + '\n'.join(violations)
+            )
+        if options['budgets']:
+            self.stdout.write(
+                self.style.SUCCESS('Бюджеты эндпоинтов соблюдены.')
+            )
+
+    def get_user(self):
+        """Отдаёт пользователя с подписками и корзиной для замеров."""
+        if self.options['user']:
+            user = User.objects.filter(username=self.options['user']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {self.options["user"]} не найден.'
+                )
+            return user
+        user = User.objects.filter(
+            shoppingcarts__isnull=False
+        ).order_by('-subscriptions_count', 'id').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей с корзиной, сначала запустите '
+                'generate_fixtures.'
+            )
+        return user
+
+    def get_clients(self, user):
+        """Создаёт клиентов: анонимного, пользователя и администратора."""
+        host = settings.ALLOWED_HOSTS[0]
+        token, _ = Token.objects.get_or_create(user=user)
+        administrator = User.objects.create_superuser(
+            username='benchmark-admin',
+            email='benchmark-admin@example.com',
+            password=None
+        )
+        admin_client = Client(HTTP_HOST=host)
+        admin_client.force_login(administrator)
+        return {
+            None: Client(HTTP_HOST=host),
+            'user': Client(
+                HTTP_HOST=host, HTTP_AUTHORIZATION=f'Token {token.key}'
+            ),
+            'admin': admin_client
+        }
+
+    def get_recipe_filters(self, user):
+        """Отдаёт параметры каждой комбинации фильтров рецептов."""
+        author = User.objects.order_by('-recipes_count').first()
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+        latest = Recipe.objects.first()
+        values = {
+            'author': [('author', author.id)],
+            'tags': [('tags', slug) for slug in slugs],
+            'is_favorited': [('is_favorited', 1)],
+            'is_in_shopping_cart': [('is_in_shopping_cart', 1)],
+            'search': [('search', latest.name.split()[0])]
+        }
+        for size in range(len(values) + 1):
+            for names in combinations(values, size):
+                yield names, [pair for name in names for pair in values[name]]
+
+    def get_endpoints(self, user):
+        """Отдаёт эндпоинты для замера: имя, путь и клиента."""
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        if recipe is None:
+            raise CommandError(
+                'Нет рецептов, сначала запустите generate_fixtures.'
+            )
+        endpoints = [
+            ('tags', '/api/tags/', None),
+            ('users-list', '/api/users/', 'user'),
+            ('users-me', '/api/users/me/', 'user'),
+            ('users-detail', f'/api/users/{recipe.author_id}/', 'user'),
+            ('recipes-list-anon', '/api/recipes/', None),
+            ('recipes-list-cursor', '/api/recipes/?cursor=', 'user'),
+            ('recipes-detail-anon', f'/api/recipes/{recipe.id}/', None),
+            ('recipes-detail', f'/api/recipes/{recipe.id}/', 'user'),
+            ('recipes-get-link', f'/api/recipes/{recipe.id}/get-link/', None),
+            ('short-link', get_short_link_path(recipe.id), None),
+            ('subscriptions', '/api/users/subscriptions/', 'user'),
+            (
+                'subscriptions-recipes-limit',
+                '/api/users/subscriptions/?recipes_limit=2',
+                'user'
+            ),
+            (
+                'download-shopping-cart',
+                '/api/recipes/download_shopping_cart/',
+                'user'
+            ),
+        ]
+        for names, params in self.get_recipe_filters(user):
+            query = '&'.join(f'{key}={value}' for key, value in params)
+            endpoints.append((
+                f'recipes-list[{",".join(names)}]',
+                f'/api/recipes/?{query}',
+                'user'
+            ))
+        for prefix in ('а', 'мол', 'Сыр', 'zzz'):
+            endpoints.append((
+                f'ingredients-search[{prefix}]',
+                f'/api/ingredients/?name={prefix}',
+                None
+            ))
+        for model in admin.site._registry:
+            meta = model._meta
+            endpoints.append((
+                f'admin-{meta.model_name}',
+                reverse(
+                    f'admin:{meta.app_label}_{meta.model_name}_changelist'
+                ),
+                'admin'
+            ))
+        if self.options['postman']:
+            endpoints.extend(self.get_postman_endpoints(user, recipe))
+        if self.options['replay']:
+            endpoints.extend(self.get_replay_endpoints())
+        return endpoints
+
+    def get_postman_endpoints(self, user, recipe):
+        """Отдаёт GET-запросы коллекции Postman для текущих данных."""
+        with open(self.options['postman'], encoding='utf-8') as file:
+            collection = json.load(file)
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:2])
+        user_ids = list(
+            User.objects.exclude(pk=user.pk).values_list('id', flat=True)[:2]
+        )
+        tag_slugs = list(Tag.objects.values_list('slug', flat=True)[:3])
+        ingredient = Ingredient.objects.first()
+        variables = {
+            'baseUrl': '',
+            'userId': user.id,
+            'secondUserId': user_ids[0],
+            'thirdUserId': user_ids[-1],
+            'firstTagId': Tag.objects.values_list('id', flat=True).first(),
+            'secondTagSlug': tag_slugs[1 % len(tag_slugs)],
+            'thirdTagSlug': tag_slugs[2 % len(tag_slugs)],
+            'firstIndredientId': ingredient.id,
+            'ingredientNameFirstLatter': ingredient.name[0],
+            'firstRecipeId': recipe.id,
+            'secondRecipeId': recipe_ids[-1]
+        }
+        return list(iter_postman_requests(collection['item'], variables))
+
+    def get_replay_endpoints(self):
+        """Читает запросы для замера из файла JSON Lines."""
+        endpoints = []
+        with open(self.options['replay'], encoding='utf-8') as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    name = f'replay:{record.get("name", line_number)}'
+                    endpoints.append(
+                        (name, record['path'], record.get('auth'))
+                    )
+                    if 'status' in record:
+                        self.expected_statuses[name] = int(record['status'])
+                except (ValueError, KeyError, TypeError) as error:
+                    raise CommandError(
+                        f'Строка {line_number}: некорректный запрос: {error}'
+                    )
+        return endpoints
+
+    def measure(self, client, path):
+        """Выполняет запрос и отдаёт статус, время в мс и число запросов."""
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started_at = time.perf_counter()
+            with TestCase.captureOnCommitCallbacks(execute=True):
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started_at
+        return response.status_code, elapsed * 1000, counter.count
+
+    def run_benchmark(self):
+        """Замеряет все эндпоинты и отдаёт результаты по именам."""
+        options = self.options
+        user = self.get_user()
+        clients = self.get_clients(user)
+        results = {}
+        for name, path, client_name in self.get_endpoints(user):
+            if options['only'] and options['only'] not in name:
+                continue
+            client = clients[client_name]
+            for _ in range(options['warmup']):
+                self.measure(client, path)
+            statuses = set()
+            timings = []
+            query_counts = []
+            for _ in range(options['runs']):
+                status, elapsed, queries = self.measure(client, path)
+                statuses.add(status)
+                timings.append(elapsed)
+                query_counts.append(queries)
+            p50, p95, p99 = get_percentiles(timings)
+            results[name] = {
+                'path': path,
+                'statuses': sorted(statuses),
+                'expected_status': self.expected_statuses.get(name),
+                'queries': max(query_counts),
+                'p50_ms': round(p50, 3),
+                'p95_ms': round(p95, 3),
+                'p99_ms': round(p99, 3)
+            }
+            self.stdout.write(
+                f'{name:<60} {"/".join(map(str, sorted(statuses)))}  '
+                f'запросов {max(query_counts):>3}  '
+                f'p50 {p50:8.2f}  p95 {p95:8.2f}  p99 {p99:8.2f} мс'
+            )
+        return results
+
+    def get_status_violations(self, results):
+        """Отдаёт эндпоинты, ответившие ошибкой или не тем статусом."""
+        violations = []
+        for name, result in results.items():
+            expected_status = result['expected_status']
+            unexpected = [
+                status for status in result['statuses']
+                if (
+                    status != expected_status if expected_status
+                    else status >= 400
+                )
+            ]
+            if unexpected:
+                violations.append(
+                    f'{name}: статус {"/".join(map(str, unexpected))}'
+                    + (
+                        f', ожидался {expected_status}'
+                        if expected_status else ''
+                    )
+                )
+        return violations
+
+    def get_budget_violations(self, results, budgets):
+        """Отдаёт эндпоинты, вышедшие за бюджет."""
+        threshold = 1 + self.options['threshold']
+        violations = []
+        for name, budget in budgets.items():
+            result = results.get(name)
+            if result is None:
+                continue
+            if 'queries' in budget and result['queries'] > budget['queries']:
+                violations.append(
+                    f'{name}: запросов {result["queries"]}, '
+                    f'бюджет {budget["queries"]}'
+                )
+            if (
+                'p95_ms' in budget
+                and result['p95_ms'] > budget['p95_ms'] * threshold
+            ):
+                violations.append(
+                    f'{name}: p95 {result["p95_ms"]} мс, '
+                    f'бюджет {budget["p95_ms"]} мс'
+                )
+        return violations
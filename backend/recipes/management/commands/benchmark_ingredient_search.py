@@ -0,0 +1,65 @@
+"""Модуль с определением команды manage.py для замера поиска продуктов."""
+
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient
+from recipes.search import (
+    fuzzy_search_ingredients, ingredient_prefix_index,
+    ingredient_trigram_index
+)
+
+
+class Command(BaseCommand):
+    """Команда сравнения поиска продуктов по индексу и через ORM."""
+
+    help = 'Сравнение поиска продуктов по началу названия: индекс и ORM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Число повторов каждого запроса.'
+        )
+        parser.add_argument(
+            'prefixes',
+            nargs='*',
+            default=('а', 'мол', 'Сыр', 'картофель', 'zzz'),
+            help='Искомые начала названий.'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        ingredient_prefix_index.ensure_fresh()
+        ingredient_trigram_index.ensure_fresh()
+        for prefix in options['prefixes']:
+            orm_time = timeit(
+                lambda: list(
+                    Ingredient.objects.filter(
+                        name__startswith=prefix
+                    ).values('id', 'name', 'measurement_unit')
+                ),
+                number=repeat
+            ) / repeat
+            index_time = timeit(
+                lambda: ingredient_prefix_index.search(prefix),
+                number=repeat
+            ) / repeat
+            fuzzy_time = timeit(
+                lambda: fuzzy_search_ingredients(prefix),
+                number=repeat
+            ) / repeat
+            self.stdout.write(
+                '{:<12} найдено {:>5}  ORM {:8.3f} мс  '
+                'индекс {:8.3f} мс  x{:.1f}  '
+                'с опечатками {:8.3f} мс'.format(
+                    prefix,
+                    len(ingredient_prefix_index.search(prefix)),
+                    orm_time * 1000,
+                    index_time * 1000,
+                    orm_time / index_time if index_time else 0,
+                    fuzzy_time * 1000
+                )
+            )
@@ -0,0 +1,63 @@
+"""Модуль с определением команды manage.py для сверки списков покупок."""
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingCart, ShoppingListItem
+from recipes.shopping_list import (
+    get_shopping_list_totals, refresh_shopping_list
+)
+
+
+class Command(BaseCommand):
+    """Команда сверки и пересборки итогов списков покупок."""
+
+    help = 'Сверка итогов списков покупок с корзинами пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересобрать расходящиеся списки покупок.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Число пользователей, сверяемых за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(
+                ShoppingCart.objects.values_list('user', flat=True)
+            ) | set(
+                ShoppingListItem.objects.values_list('user', flat=True)
+            )
+        )
+        chunk_size = options['chunk_size']
+        drifted_users = 0
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            expected = get_shopping_list_totals(chunk)
+            actual = {
+                (user_id, ingredient_id): (total_amount, recipe_count)
+                for user_id, ingredient_id, total_amount, recipe_count
+                in ShoppingListItem.objects.filter(
+                    user__in=chunk
+                ).values_list(
+                    'user', 'ingredient', 'total_amount', 'recipe_count'
+                )
+            }
+            drifted = {
+                user_id
+                for (user_id, _), _ in expected.items() ^ actual.items()
+            }
+            drifted_users += len(drifted)
+            if drifted and options['rebuild']:
+                refresh_shopping_list(drifted)
+        self.stdout.write(
+            f'Проверено пользователей: {len(user_ids)}, '
+            f'с расхождениями: {drifted_users}.'
+        )
+        if drifted_users and options['rebuild']:
+            self.stdout.write(self.style.SUCCESS('Списки пересобраны.'))
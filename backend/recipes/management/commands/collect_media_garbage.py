@@ -0,0 +1,107 @@
+"""Модуль с определением команды manage.py для очистки медиафайлов."""
+
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from recipes.constants import MEDIA_GC_MIN_AGE_SECONDS
+from recipes.images import get_derivative_source_names
+from recipes.models import ImageJob, Recipe, User
+
+
+class Command(BaseCommand):
+    """Команда удаления файлов, на которые не ссылается база данных.
+
+    Файлы обходятся потоком и сверяются с базой пачками, поэтому
+    ни список файлов, ни список ссылок целиком в память не загружаются.
+    """
+
+    help = 'Удаление неиспользуемых медиафайлов.'
+
+    targets = (
+        (Recipe, 'image'),
+        (User, 'avatar'),
+        (ImageJob, 'source'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, какие файлы будут удалены.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Число файлов, сверяемых с базой за один запрос.'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=MEDIA_GC_MIN_AGE_SECONDS,
+            help='Не трогать файлы моложе этого числа секунд.'
+        )
+
+    def walk_files(self, storage, directory, min_mtime):
+        """Отдаёт имена достаточно старых файлов каталога хранилища."""
+        for root, _, filenames in os.walk(storage.path(directory)):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if os.path.getmtime(path) < min_mtime:
+                    yield os.path.relpath(path, storage.location)
+
+    def get_referenced_names(self, model, field, names):
+        """Отдаёт имена из пачки, на которые ссылаются объекты модели."""
+        return set(
+            model.objects.filter(
+                **{f'{field}__in': names}
+            ).values_list(field, flat=True)
+        )
+
+    def collect(self, model, field, options):
+        """Удаляет неиспользуемые файлы поля и отдаёт их число и объём."""
+        model_field = model._meta.get_field(field)
+        storage = model_field.storage
+        directory = model_field.upload_to
+        if not storage.exists(directory):
+            return 0, 0
+        files = self.walk_files(
+            storage, directory, time.time() - options['min_age']
+        )
+        removed = size = 0
+        while chunk := list(islice(files, options['chunk_size'])):
+            owners = {
+                name: (
+                    get_derivative_source_names(name)
+                    if os.path.basename(os.path.dirname(name))
+                    == 'derivatives' else [name]
+                )
+                for name in chunk
+            }
+            referenced = self.get_referenced_names(
+                model,
+                field,
+                [owner for names in owners.values() for owner in names]
+            )
+            for name, names in owners.items():
+                if referenced.intersection(names):
+                    continue
+                removed += 1
+                size += storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+        return removed, size
+
+    def handle(self, *args, **options):
+        for model, field in self.targets:
+            removed, size = self.collect(model, field, options)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: '
+                f'{"найдено" if options["dry_run"] else "удалено"} '
+                f'{removed} файлов, {size // 1024} КБ.'
+            )
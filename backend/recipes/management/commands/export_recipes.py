@@ -0,0 +1,137 @@
+"""Модуль с определением команды manage.py для выгрузки рецептов."""
+
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min, Prefetch
+
+from recipes.constants import RECIPE_TRANSFER_CHUNK_SIZE
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+
+
+def get_recipe_record(recipe):
+    """Отдаёт запись рецепта со связями по естественным ключам."""
+    return {
+        'id': recipe.id,
+        'author': recipe.author.username,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'created_at': recipe.created_at.isoformat(),
+        'image': recipe.image.name or None,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {
+                'name': recipe_ingredient.ingredient.name,
+                'measurement_unit':
+                    recipe_ingredient.ingredient.measurement_unit,
+                'amount': recipe_ingredient.amount
+            }
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        ],
+        'favorited_by': [
+            favorite.user.username for favorite in recipe.favorites.all()
+        ],
+        'in_shopping_cart_of': [
+            cart.user.username for cart in recipe.shoppingcarts.all()
+        ]
+    }
+
+
+def export_range(start, stop, output, chunk_size):
+    """Построчно выгружает рецепты с id из [start, stop) в NDJSON."""
+    recipes = Recipe.objects.filter(
+        id__gte=start, id__lt=stop
+    ).order_by('id').select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'recipe_ingredients',
+            RecipeIngredient.objects.select_related('ingredient')
+        ),
+        Prefetch('favorites', Favorite.objects.select_related('user')),
+        Prefetch('shoppingcarts', ShoppingCart.objects.select_related('user'))
+    )
+    exported = 0
+    for recipe in recipes.iterator(chunk_size=chunk_size):
+        output.write(
+            json.dumps(get_recipe_record(recipe), ensure_ascii=False) + '\n'
+        )
+        exported += 1
+    return exported
+
+
+def export_range_to_file(start, stop, path, chunk_size):
+    """Выгружает диапазон рецептов в отдельный файл процесса."""
+    with open(path, 'w', encoding='UTF-8') as output:
+        return export_range(start, stop, output, chunk_size)
+
+
+class Command(BaseCommand):
+    """Команда потоковой выгрузки рецептов со связями в NDJSON."""
+
+    help = 'Выгрузка рецептов с продуктами, тегами, избранным и корзинами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='Путь к файлу .ndjson или "-" для вывода в консоль.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RECIPE_TRANSFER_CHUNK_SIZE,
+            help='Число рецептов, загружаемых из БД за один запрос.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Число процессов, делящих рецепты по диапазонам id.'
+        )
+
+    def handle(self, *args, **options):
+        bounds = Recipe.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            bounds = {'first': 0, 'last': -1}
+        first, stop = bounds['first'], bounds['last'] + 1
+        workers = options['workers']
+        if options['output'] == '-':
+            if workers > 1:
+                raise CommandError('Вывод в консоль возможен в один поток.')
+            exported = export_range(
+                first, stop, sys.stdout, options['chunk_size']
+            )
+        elif workers <= 1:
+            exported = export_range_to_file(
+                first, stop, options['output'], options['chunk_size']
+            )
+        else:
+            exported = self.export_parallel(first, stop, workers, options)
+        self.stderr.write(f'Выгружено рецептов: {exported}.')
+
+    def export_parallel(self, first, stop, workers, options):
+        """Выгружает диапазоны id в процессах и склеивает их файлы."""
+        step = max(1, -(-(stop - first) // workers))
+        parts = [
+            (
+                start,
+                min(start + step, stop),
+                f'{options["output"]}.part{number}',
+                options['chunk_size']
+            )
+            for number, start in enumerate(range(first, stop, step))
+        ]
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            exported = sum(pool.starmap(export_range_to_file, parts))
+        with open(options['output'], 'wb') as output:
+            for *_, path, _ in parts:
+                with open(path, 'rb') as part:
+                    shutil.copyfileobj(part, output)
+                os.remove(path)
+        return exported
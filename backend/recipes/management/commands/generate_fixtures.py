@@ -0,0 +1,346 @@
+"""Модуль с определением команды manage.py для генерации тестовых данных."""
+
+import random
+import time
+from array import array
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.constants import (
+    FIXTURES_BATCH_SIZE, FIXTURES_UPDATE_BATCH_SIZE, RECIPE_IMAGE_MAX_SIZE
+)
+from recipes.images import (
+    encode_image, get_derivative_sizes, save_derivatives
+)
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCart, Subscription, Tag, User
+)
+from recipes.shopping_list import refresh_shopping_list
+from recipes.versions import bump_version
+
+DISHES = (
+    'Суп', 'Салат', 'Рагу', 'Запеканка', 'Пирог', 'Омлет', 'Паста',
+    'Каша', 'Котлеты', 'Плов', 'Смузи', 'Блины', 'Жаркое', 'Соус'
+)
+COOKING_STEPS = (
+    'Нарезать продукты.', 'Смешать всё в миске.', 'Довести до кипения.',
+    'Тушить под крышкой.', 'Запекать до золотистой корочки.',
+    'Посолить и поперчить по вкусу.', 'Подавать горячим.'
+)
+
+
+def get_zipf_weights(size, exponent):
+    """Отдаёт накопленные веса закона Ципфа для рангов 1..size."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def iter_links(seed, sources, mean, targets, cum_weights, exclude_self):
+    """Отдаёт пары (источник, цель) с популярностью целей по Ципфу.
+
+    Пары однозначно определяются seed, поэтому их можно сначала
+    пересчитать для счётчиков, а затем сгенерировать заново для вставки.
+    """
+    rng = random.Random(seed)
+    population = range(targets)
+    for source in range(sources):
+        count = rng.randint(0, 2 * mean)
+        if not count:
+            continue
+        chosen = set(
+            rng.choices(population, cum_weights=cum_weights, k=count)
+        )
+        if exclude_self:
+            chosen.discard(source)
+        for target in sorted(chosen):
+            yield source, target
+
+
+def batched(iterable, size):
+    """Делит поток на списки заданного размера."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    """Команда генерации пользователей, рецептов и связей для нагрузки.
+
+    Авторство рецептов, избранное, корзины и подписки распределены
+    по закону Ципфа: немногие авторы и рецепты собирают большую часть
+    связей. Счётчики считаются до вставки, поэтому пересчёт не нужен.
+    """
+
+    help = 'Генерация тестовых данных для нагрузочного тестирования.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites-per-user', type=int, default=20,
+            help='Среднее число рецептов в избранном пользователя.'
+        )
+        parser.add_argument(
+            '--carts-per-user', type=int, default=3,
+            help='Среднее число рецептов в корзине пользователя.'
+        )
+        parser.add_argument(
+            '--subscriptions-per-user', type=int, default=10,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель степени закона Ципфа.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=FIXTURES_BATCH_SIZE
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='fixture',
+            help='Префикс имён сгенерированных пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not self.ingredient_ids or not self.tag_ids:
+            raise CommandError(
+                'Сначала загрузите продукты и теги: '
+                'import_ingredients, import_tags.'
+            )
+        if User.objects.filter(
+            username__startswith=options['prefix']
+        ).exists():
+            raise CommandError(
+                f'Пользователи с префиксом "{options["prefix"]}" уже есть, '
+                'укажите другой --prefix.'
+            )
+        self.rng.shuffle(self.ingredient_ids)
+        self.ingredient_weights = get_zipf_weights(
+            len(self.ingredient_ids), options['zipf']
+        )
+        self.user_weights = get_zipf_weights(
+            options['users'], options['zipf']
+        )
+        self.recipe_weights = get_zipf_weights(
+            options['recipes'], options['zipf']
+        )
+        self.image = self.create_placeholder_image()
+        self.run_step('Пользователи', self.create_users)
+        self.run_step('Рецепты', self.create_recipes)
+        self.run_step('Избранное', self.create_links, Favorite, 'recipe')
+        self.run_step('Корзины', self.create_links, ShoppingCart, 'recipe')
+        self.run_step('Подписки', self.create_links, Subscription, 'author')
+        self.run_step('Списки покупок', self.refresh_shopping_lists)
+        bump_version(Recipe)
+
+    def run_step(self, title, step, *args):
+        """Выполняет шаг генерации и выводит число строк и время."""
+        started_at = time.monotonic()
+        created = step(*args)
+        self.stdout.write(
+            f'{title}: {created} строк за '
+            f'{time.monotonic() - started_at:.1f} с.'
+        )
+
+    def create_placeholder_image(self):
+        """Сохраняет общее для всех рецептов изображение-заглушку.
+
+        Хранилище называет файлы по хешу содержимого, поэтому повторные
+        запуски используют один и тот же файл.
+        """
+        field = Recipe._meta.get_field('image')
+        image = Image.new(
+            'RGB', (RECIPE_IMAGE_MAX_SIZE, RECIPE_IMAGE_MAX_SIZE), 'lightgray'
+        )
+        name = field.storage.save(
+            field.generate_filename(None, 'placeholder.jpg'),
+            ContentFile(encode_image(image, 'jpg'))
+        )
+        save_derivatives(
+            field.storage,
+            name,
+            image,
+            get_derivative_sizes(Recipe._meta.label_lower, 'image')
+        )
+        return name
+
+    def get_link_options(self, model):
+        """Отдаёт параметры генерации связей модели."""
+        options = self.options
+        seed = options['seed']
+        return {
+            Favorite: (
+                seed + 1, options['favorites_per_user'],
+                options['recipes'], self.recipe_weights, False
+            ),
+            ShoppingCart: (
+                seed + 2, options['carts_per_user'],
+                options['recipes'], self.recipe_weights, False
+            ),
+            Subscription: (
+                seed + 3, options['subscriptions_per_user'],
+                options['users'], self.user_weights, True
+            ),
+        }[model]
+
+    def iter_model_links(self, model):
+        """Отдаёт пары (индекс пользователя, индекс цели) связей модели."""
+        seed, mean, targets, weights, exclude_self = self.get_link_options(
+            model
+        )
+        return iter_links(
+            seed, self.options['users'], mean, targets, weights, exclude_self
+        )
+
+    def count_links(self, model, size, by_target):
+        """Считает связи модели по пользователям или по целям."""
+        counts = array('q', bytes(8 * size))
+        for source, target in self.iter_model_links(model):
+            counts[target if by_target else source] += 1
+        return counts
+
+    def create_users(self):
+        """Создаёт пользователей с уже посчитанными счётчиками."""
+        options = self.options
+        users = options['users']
+        self.recipe_authors = array('q', self.rng.choices(
+            range(users), cum_weights=self.user_weights, k=options['recipes']
+        ))
+        recipes_count = array('q', bytes(8 * users))
+        for author in self.recipe_authors:
+            recipes_count[author] += 1
+        subscriptions_count = self.count_links(Subscription, users, False)
+        subscribers_count = self.count_links(Subscription, users, True)
+        password = make_password(options['prefix'])
+        self.user_ids = array('q')
+        prefix = options['prefix']
+        for batch in batched(range(users), options['batch_size']):
+            created = User.objects.bulk_create(
+                User(
+                    username=f'{prefix}{index}',
+                    email=f'{prefix}{index}@example.com',
+                    first_name='Тест',
+                    last_name=f'Пользователь {index}',
+                    password=password,
+                    recipes_count=recipes_count[index],
+                    subscriptions_count=subscriptions_count[index],
+                    subscribers_count=subscribers_count[index]
+                )
+                for index in batch
+            )
+            self.user_ids.extend(user.id for user in created)
+        return users
+
+    def build_recipe(self, index, favorites_count, now):
+        """Создаёт объект рецепта со случайными данными."""
+        rng = self.rng
+        recipe = Recipe(
+            author_id=self.user_ids[self.recipe_authors[index]],
+            name=f'{rng.choice(DISHES)} №{index}',
+            text=' '.join(rng.sample(COOKING_STEPS, rng.randint(2, 5))),
+            image=self.image,
+            cooking_time=rng.randint(5, 180),
+            favorites_count=favorites_count[index]
+        )
+        recipe.generated_at = now - timedelta(
+            seconds=rng.randint(0, 365 * 24 * 60 * 60)
+        )
+        return recipe
+
+    def build_recipe_relations(self, recipes):
+        """Создаёт продукты и теги рецептов пачки."""
+        rng = self.rng
+        recipe_ingredients = []
+        recipe_tags = []
+        for recipe in recipes:
+            ingredient_indexes = set(rng.choices(
+                range(len(self.ingredient_ids)),
+                cum_weights=self.ingredient_weights,
+                k=round(rng.triangular(3, 15, 7))
+            ))
+            recipe_ingredients.extend(
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=self.ingredient_ids[ingredient_index],
+                    amount=rng.choice((1, 2, 5, 10, 50, 100, 200, 500))
+                )
+                for ingredient_index in ingredient_indexes
+            )
+            recipe_tags.extend(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for tag_id in rng.sample(
+                    self.tag_ids, rng.randint(1, min(3, len(self.tag_ids)))
+                )
+            )
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        Recipe.tags.through.objects.bulk_create(recipe_tags)
+
+    def create_recipes(self):
+        """Создаёт рецепты с продуктами, тегами и числом добавлений."""
+        options = self.options
+        favorites_count = self.count_links(
+            Favorite, options['recipes'], True
+        )
+        now = timezone.now()
+        self.recipe_ids = array('q')
+        for batch in batched(range(options['recipes']), options['batch_size']):
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    self.build_recipe(index, favorites_count, now)
+                    for index in batch
+                )
+                for recipe in recipes:
+                    recipe.created_at = recipe.generated_at
+                Recipe.objects.bulk_update(
+                    recipes,
+                    ('created_at',),
+                    batch_size=FIXTURES_UPDATE_BATCH_SIZE
+                )
+                self.build_recipe_relations(recipes)
+            self.recipe_ids.extend(recipe.id for recipe in recipes)
+        return options['recipes']
+
+    def create_links(self, model, target_field):
+        """Создаёт связи пользователей с рецептами или авторами."""
+        target_ids = (
+            self.user_ids if model is Subscription else self.recipe_ids
+        )
+        created = 0
+        for batch in batched(
+            self.iter_model_links(model), self.options['batch_size']
+        ):
+            model.objects.bulk_create(
+                model(
+                    user_id=self.user_ids[source],
+                    **{f'{target_field}_id': target_ids[target]}
+                )
+                for source, target in batch
+            )
+            created += len(batch)
+        return created
+
+    def refresh_shopping_lists(self):
+        """Собирает итоги списков покупок пользователей с корзинами."""
+        user_ids = sorted({
+            self.user_ids[source]
+            for source, _ in self.iter_model_links(ShoppingCart)
+        })
+        chunk_size = max(1, self.options['batch_size'] // 50)
+        for start in range(0, len(user_ids), chunk_size):
+            refresh_shopping_list(user_ids[start:start + chunk_size])
+        return len(user_ids)
@@ -0,0 +1,53 @@
+"""Модуль с определением команды manage.py для уменьшенных копий."""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.constants import AVATAR_DERIVATIVES, RECIPE_IMAGE_DERIVATIVES
+from recipes.images import generate_derivatives
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    """Команда создания уменьшенных копий уже загруженных изображений."""
+
+    help = 'Создание уменьшенных копий и WebP для загруженных изображений.'
+
+    targets = (
+        (Recipe, 'image', RECIPE_IMAGE_DERIVATIVES),
+        (User, 'avatar', AVATAR_DERIVATIVES),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие копии.'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, sizes in self.targets:
+            processed = skipped = failed = 0
+            instances = model.objects.exclude(
+                Q(**{f'{field}__isnull': True}) | Q(**{field: ''})
+            ).only('pk', field)
+            for instance in instances.iterator():
+                try:
+                    created = generate_derivatives(
+                        getattr(instance, field),
+                        sizes,
+                        overwrite=options['force']
+                    )
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(
+                        f'{model._meta.verbose_name} #{instance.pk}: {error}'
+                    )
+                else:
+                    processed += created
+                    skipped += not created
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: '
+                f'обработано {processed}, пропущено {skipped}, '
+                f'ошибок {failed}.'
+            )
@@ -1,18 +1,308 @@
-"""Модуль с функцией импорта данных в БД проекта Foodgram."""
+"""Модуль с потоковым импортом данных в БД проекта Foodgram.
 
+Файлы JSON (массив объектов) и CSV читаются по частям, записи
+вставляются пачками, каждая в своей транзакции, с обновлением
+существующих строк по уникальному ключу. После каждой пачки
+сохраняется контрольная точка, с которой импорт можно продолжить.
+"""
+
+import csv
 import json
 import os
+import re
+import time
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.constants import (
+    IMPORT_BATCH_SIZE, IMPORT_CHECKPOINT_SUFFIX, IMPORT_READ_CHUNK_SIZE
+)
+from recipes.versions import bump_version
+
+WHITESPACE_REG_EX = re.compile(r'\s*')
+
+
+def iter_json_array(data_file, chunk_size=IMPORT_READ_CHUNK_SIZE):
+    """Построчно отдаёт объекты из JSON-массива, не читая файл целиком.
+
+    Между элементами должна стоять ровно одна запятая, запятая перед
+    закрывающей скобкой не допускается.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof, expected = '', 0, False, '['
+    while True:
+        position = WHITESPACE_REG_EX.match(buffer, position).end()
+        if position >= len(buffer):
+            if eof:
+                raise ValueError('Файл закончился до конца массива.')
+            buffer, position = data_file.read(chunk_size), 0
+            eof = not buffer
+            continue
+        char = buffer[position]
+        if expected == '[':
+            if char != '[':
+                raise ValueError('Файл должен содержать JSON-массив.')
+            expected, position = 'first', position + 1
+            continue
+        if expected == ',':
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(
+                    'Элементы массива должны разделяться запятой.'
+                )
+            expected, position = 'value', position + 1
+            continue
+        if char == ']':
+            if expected == 'first':
+                return
+            raise ValueError('Лишняя запятая перед концом массива.')
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = data_file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+        expected = ','
+        yield record
+
+
+def iter_csv_rows(data_file, fields):
+    """Отдаёт строки CSV как словари; строка заголовка пропускается."""
+    for number, row in enumerate(csv.reader(data_file)):
+        if number == 0 and tuple(row) == tuple(fields):
+            continue
+        yield dict(zip(fields, row)) if len(row) == len(fields) else row
+
+
+def iter_records(data_file, path, csv_fields):
+    """Выбирает разбор файла по его расширению."""
+    if path.endswith('.csv'):
+        return iter_csv_rows(data_file, csv_fields)
+    return iter_json_array(data_file)
+
+
+def get_file_signature(path):
+    """Отдаёт признаки файла, по которым сверяется контрольная точка."""
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime
+    }
+
+
+def load_checkpoint(checkpoint_path, path):
+    """Отдаёт число уже импортированных записей файла."""
+    if not os.path.exists(checkpoint_path):
+        return 0
+    try:
+        with open(checkpoint_path, encoding='UTF-8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint.get('file') != get_file_signature(path):
+            raise CommandError(
+                'Контрольная точка относится к другой версии файла.'
+            )
+        return checkpoint['records']
+    except (ValueError, KeyError, AttributeError) as error:
+        raise CommandError(
+            f'Повреждена контрольная точка {checkpoint_path}: {error!r}.'
+        ) from error
+
 
+def save_checkpoint(checkpoint_path, path, records):
+    """Атомарно сохраняет число импортированных записей файла."""
+    temporary_path = f'{checkpoint_path}.tmp'
+    with open(temporary_path, 'w', encoding='UTF-8') as checkpoint_file:
+        json.dump(
+            {'file': get_file_signature(path), 'records': records},
+            checkpoint_file
+        )
+    os.replace(temporary_path, checkpoint_path)
 
-def import_data(filename, model):
-    """Загружает данные в модель."""
-    file_path = os.path.join(settings.BASE_DIR, 'data', filename)
-    data_file = open(file_path, 'r', encoding='UTF-8')
-    data = json.loads(data_file.read())
-    data_file.close()
-    model.objects.bulk_create(
-        (model(**tag_or_ing) for tag_or_ing in data),
-        ignore_conflicts=True
+
+def find_unique_conflicts(model, objects, unique_fields):
+    """Ищет значения других уникальных полей, занятые чужим ключом.
+
+    Обновление по unique_fields не разрешает конфликт по остальным
+    уникальным полям: строка с тем же значением под другим ключом
+    привела бы к IntegrityError посреди пачки.
+    """
+    conflicts = []
+    for field in model._meta.concrete_fields:
+        if not field.unique or field.primary_key or (
+            field.name in unique_fields
+        ):
+            continue
+        keys = {}
+        for instance in objects:
+            value = getattr(instance, field.name)
+            key = tuple(getattr(instance, name) for name in unique_fields)
+            if keys.setdefault(value, key) != key:
+                conflicts.append((field.name, value, keys[value], key))
+        for value, *key in model.objects.filter(
+            **{f'{field.name}__in': keys}
+        ).values_list(field.name, *unique_fields):
+            if tuple(key) != keys[value]:
+                conflicts.append((field.name, value, tuple(key), keys[value]))
+    return conflicts
+
+
+def write_batch(model, objects, unique_fields):
+    """Вставляет пачку объектов, обновляя уже существующие строки.
+
+    Повторы ключа внутри пачки схлопываются до последней записи:
+    INSERT ... ON CONFLICT не может обновить одну строку дважды.
+    """
+    objects = list({
+        tuple(getattr(instance, field) for field in unique_fields): instance
+        for instance in objects
+    }.values())
+    update_fields = [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in unique_fields
+    ]
+    conflict_options = (
+        {
+            'update_conflicts': True,
+            'unique_fields': unique_fields,
+            'update_fields': update_fields
+        }
+        if update_fields else {'ignore_conflicts': True}
     )
+    conflicts = find_unique_conflicts(model, objects, unique_fields)
+    if conflicts:
+        raise CommandError(
+            'Значения уникальных полей заняты записями с другим ключом: '
+            + '; '.join(
+                f'{field}={value!r} у {first} и {second}'
+                for field, value, first, second in conflicts
+            )
+            + '.'
+        )
+    with transaction.atomic():
+        model.objects.bulk_create(objects, **conflict_options)
+
+
+def build_object(model, record):
+    """Создаёт и проверяет объект модели по записи файла."""
+    if not isinstance(record, dict):
+        raise ValidationError('Запись должна быть объектом.')
+    try:
+        instance = model(**record)
+    except TypeError as error:
+        raise ValidationError(str(error))
+    instance.clean_fields()
+    return instance
+
+
+class ImportCommand(BaseCommand):
+    """Базовая команда потокового импорта справочника."""
+
+    model = None
+    default_filename = None
+    unique_fields = ()
+    csv_fields = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(
+                settings.BASE_DIR, 'data', self.default_filename
+            ),
+            help='Путь к файлу .json или .csv.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Число записей в одной пачке и транзакции.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только разобрать и проверить записи.'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить с сохранённой контрольной точки.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Путь к файлу контрольной точки.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint_path = options['checkpoint'] = (
+            options['checkpoint'] or path + IMPORT_CHECKPOINT_SUFFIX
+        )
+        skip = (
+            load_checkpoint(checkpoint_path, path)
+            if options['resume'] else 0
+        )
+        read = imported = invalid = 0
+        checkpoint = skip
+        batch = []
+        started_at = time.monotonic()
+        with open(path, encoding='UTF-8', newline='') as data_file:
+            try:
+                for record in iter_records(data_file, path, self.csv_fields):
+                    read += 1
+                    if read <= skip:
+                        continue
+                    try:
+                        batch.append(build_object(self.model, record))
+                    except ValidationError as error:
+                        invalid += 1
+                        self.stderr.write(f'Запись {read}: {error}')
+                    if read % options['batch_size'] == 0:
+                        imported += self.flush(batch, read, options)
+                        if not options['dry_run']:
+                            checkpoint = read
+                        self.report(read, skip, started_at)
+            except (ValueError, KeyError) as error:
+                raise CommandError(
+                    f'Запись {read + 1}: не удалось разобрать файл: {error}. '
+                    f'Последняя контрольная точка: {checkpoint} записей.'
+                ) from error
+            imported += self.flush(batch, read, options)
+        if not options['dry_run']:
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            bump_version(self.model)
+        self.stdout.write(
+            f'{self.model._meta.verbose_name_plural}: '
+            f'{"проверено" if options["dry_run"] else "загружено"} '
+            f'{imported}, пропущено по контрольной точке {min(skip, read)}, '
+            f'с ошибками {invalid}, '
+            f'за {time.monotonic() - started_at:.1f} с.'
+        )
+
+    def flush(self, batch, read, options):
+        """Записывает накопленную пачку и сохраняет контрольную точку."""
+        count = len(batch)
+        if not options['dry_run']:
+            if batch:
+                write_batch(self.model, batch, self.unique_fields)
+            save_checkpoint(options['checkpoint'], options['path'], read)
+        batch.clear()
+        return count
+
+    def report(self, read, skip, started_at):
+        """Выводит прогресс и скорость импорта."""
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            f'Прочитано записей: {read}, '
+            f'{max(read - skip, 0) / elapsed if elapsed else 0:.0f} в секунду.'
+        )
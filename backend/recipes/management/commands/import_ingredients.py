@@ -1,15 +1,14 @@
 """Модуль с определением команды manage.py для импорта продуктов в БД."""
 
-from django.core.management.base import BaseCommand
-
-from recipes.management.commands.import_data import import_data
+from recipes.management.commands.import_data import ImportCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
+class Command(ImportCommand):
     """Команда управления импортом продуктов."""
 
-    help = 'Импорт продуктов из .json файла.'
-
-    def handle(self, *args, **options):
-        return import_data('ingredients.json', Ingredient)
+    help = 'Потоковый импорт продуктов из файла .json или .csv.'
+    model = Ingredient
+    default_filename = 'ingredients.json'
+    unique_fields = ('name', 'measurement_unit')
+    csv_fields = ('name', 'measurement_unit')
@@ -0,0 +1,241 @@
+"""Модуль с определением команды manage.py для загрузки рецептов."""
+
+import json
+import multiprocessing
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from recipes.constants import RECIPE_TRANSFER_CHUNK_SIZE
+from recipes.counters import change_counters
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag, User
+)
+from recipes.shopping_list import refresh_shopping_list
+from recipes.versions import bump_version
+
+
+def split_file(path, parts):
+    """Делит файл на диапазоны байтов, границы которых на концах строк."""
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, 'rb') as data_file:
+        for part in range(1, parts):
+            offset = size * part // parts
+            if offset > offsets[-1]:
+                data_file.seek(offset - 1)
+                data_file.readline()
+                offset = data_file.tell()
+            offsets.append(max(offset, offsets[-1]))
+    offsets.append(size)
+    return list(zip(offsets, offsets[1:]))
+
+
+def iter_part_records(path, start, end):
+    """Построчно читает записи NDJSON из диапазона байтов файла."""
+    with open(path, 'rb') as data_file:
+        data_file.seek(start)
+        while data_file.tell() < end:
+            line = data_file.readline()
+            if line.strip():
+                yield json.loads(line)
+
+
+def get_ingredient_key(ingredient):
+    """Отдаёт естественный ключ продукта из записи."""
+    return ingredient['name'], ingredient['measurement_unit']
+
+
+def resolve_batch(records):
+    """Находит пользователей, теги и продукты пачки по три запроса."""
+    users = User.objects.in_bulk(
+        {
+            username for record in records
+            for username in (
+                record['author'],
+                *record['favorited_by'],
+                *record['in_shopping_cart_of']
+            )
+        },
+        field_name='username'
+    )
+    tags = Tag.objects.in_bulk(
+        {slug for record in records for slug in record['tags']},
+        field_name='slug'
+    )
+    ingredients = {
+        (ingredient.name, ingredient.measurement_unit): ingredient
+        for ingredient in Ingredient.objects.filter(
+            name__in={
+                ingredient['name']
+                for record in records
+                for ingredient in record['ingredients']
+            }
+        )
+    }
+    return users, tags, ingredients
+
+
+def get_missing_keys(record, users, tags, ingredients):
+    """Отдаёт естественные ключи записи, которых нет в базе."""
+    return [
+        *(
+            username for username in (
+                record['author'],
+                *record['favorited_by'],
+                *record['in_shopping_cart_of']
+            ) if username not in users
+        ),
+        *(slug for slug in record['tags'] if slug not in tags),
+        *(
+            '{} ({})'.format(*get_ingredient_key(ingredient))
+            for ingredient in record['ingredients']
+            if get_ingredient_key(ingredient) not in ingredients
+        )
+    ]
+
+
+def import_batch(records):
+    """Загружает пачку рецептов со связями в одной транзакции.
+
+    Отдаёт число загруженных рецептов, сообщения о пропущенных
+    и id пользователей, чьи списки покупок нужно пересчитать.
+    """
+    users, tags, ingredients = resolve_batch(records)
+    existing = set(
+        Recipe.objects.filter(
+            author__in=[user.id for user in users.values()],
+            name__in={record['name'] for record in records}
+        ).values_list('author', 'name', 'created_at')
+    )
+    errors = []
+    accepted = []
+    for record in records:
+        missing = get_missing_keys(record, users, tags, ingredients)
+        if missing:
+            errors.append(
+                f'Рецепт #{record["id"]}: не найдены {", ".join(missing)}.'
+            )
+            continue
+        created_at = parse_datetime(record['created_at'])
+        key = (users[record['author']].id, record['name'], created_at)
+        if key in existing:
+            continue
+        existing.add(key)
+        accepted.append((record, created_at))
+    if not accepted:
+        return 0, errors, set()
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=users[record['author']],
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record['image']
+            )
+            for record, _ in accepted
+        )
+        for recipe, (_, created_at) in zip(recipes, accepted):
+            recipe.created_at = created_at
+        Recipe.objects.bulk_update(recipes, ('created_at',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[get_ingredient_key(ingredient)],
+                amount=ingredient['amount']
+            )
+            for recipe, (record, _) in zip(recipes, accepted)
+            for ingredient in record['ingredients']
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tags[slug])
+            for recipe, (record, _) in zip(recipes, accepted)
+            for slug in set(record['tags'])
+        )
+        favorites = Favorite.objects.bulk_create(
+            Favorite(recipe=recipe, user=users[username])
+            for recipe, (record, _) in zip(recipes, accepted)
+            for username in set(record['favorited_by'])
+        )
+        carts = ShoppingCart.objects.bulk_create(
+            ShoppingCart(recipe=recipe, user=users[username])
+            for recipe, (record, _) in zip(recipes, accepted)
+            for username in set(record['in_shopping_cart_of'])
+        )
+        change_counters(Recipe, recipes)
+        change_counters(Favorite, favorites)
+    return len(recipes), errors, {cart.user_id for cart in carts}
+
+
+def import_part(path, start, end, batch_size):
+    """Загружает рецепты из диапазона байтов файла пачками."""
+    records = iter_part_records(path, start, end)
+    imported = 0
+    errors = []
+    cart_user_ids = set()
+    while batch := list(islice(records, batch_size)):
+        batch_imported, batch_errors, batch_user_ids = import_batch(batch)
+        imported += batch_imported
+        errors.extend(batch_errors)
+        cart_user_ids |= batch_user_ids
+    return imported, errors, cart_user_ids
+
+
+class Command(BaseCommand):
+    """Команда потоковой загрузки рецептов со связями из NDJSON.
+
+    Авторы, теги и продукты ищутся по естественным ключам: имени
+    пользователя, слагу, названию с единицей измерения. Рецепт,
+    совпадающий с существующим по автору, названию и времени
+    публикации, пропускается, поэтому загрузку можно повторять.
+    """
+
+    help = 'Загрузка рецептов, выгруженных командой export_recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .ndjson.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECIPE_TRANSFER_CHUNK_SIZE,
+            help='Число рецептов в одной пачке и транзакции.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=(
+                'Число процессов, делящих файл на части по границам '
+                'строк. Имеет смысл только для PostgreSQL.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        parts = [
+            (options['path'], start, end, options['batch_size'])
+            for start, end in split_file(options['path'], workers)
+        ]
+        if workers == 1:
+            results = [import_part(*parts[0])]
+        else:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                results = pool.starmap(import_part, parts)
+        imported = 0
+        cart_user_ids = set()
+        for part_imported, part_errors, part_user_ids in results:
+            imported += part_imported
+            cart_user_ids |= part_user_ids
+            for error in part_errors:
+                self.stderr.write(error)
+        cart_user_ids = sorted(cart_user_ids)
+        chunk_size = options['batch_size']
+        for start in range(0, len(cart_user_ids), chunk_size):
+            refresh_shopping_list(cart_user_ids[start:start + chunk_size])
+        bump_version(Recipe)
+        self.stdout.write(f'Загружено рецептов: {imported}.')
@@ -1,15 +1,14 @@
 """Модуль с определением команды manage.py для импорта тегов в БД."""
 
-from django.core.management.base import BaseCommand
-
-from recipes.management.commands.import_data import import_data
+from recipes.management.commands.import_data import ImportCommand
 from recipes.models import Tag
 
 
-class Command(BaseCommand):
+class Command(ImportCommand):
     """Команда управления импортом тегов."""
 
-    help = 'Импорт тегов из .json файла.'
-
-    def handle(self, *args, **options):
-        return import_data('tags.json', Tag)
+    help = 'Потоковый импорт тегов из файла .json или .csv.'
+    model = Tag
+    default_filename = 'tags.json'
+    unique_fields = ('slug',)
+    csv_fields = ('name', 'slug')
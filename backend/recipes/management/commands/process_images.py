@@ -0,0 +1,35 @@
+"""Модуль с определением команды manage.py для обработки изображений."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_pending_image_jobs
+
+
+class Command(BaseCommand):
+    """Команда обработки очереди изображений."""
+
+    help = 'Обработка загруженных изображений из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а периодически проверять очередь.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Пауза между проверками очереди в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_image_jobs()
+            if processed:
+                self.stdout.write(f'Обработано изображений: {processed}.')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
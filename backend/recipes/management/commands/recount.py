@@ -0,0 +1,42 @@
+"""Модуль с определением команды manage.py для пересчёта счётчиков."""
+
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount_counters
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    """Команда сверки и исправления счётчиков рецептов и пользователей."""
+
+    help = 'Сверка счётчиков рецептов и пользователей с данными.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать число расхождений.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Число объектов, сверяемых за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        drifted = 0
+        for model in (User, Recipe):
+            pks = list(model.objects.order_by('pk').values_list(
+                'pk', flat=True
+            ))
+            for start in range(0, len(pks), chunk_size):
+                drifted += recount_counters(
+                    {model: pks[start:start + chunk_size]},
+                    dry_run=options['dry_run']
+                )
+        self.stdout.write(
+            f'{"Найдено" if options["dry_run"] else "Исправлено"} '
+            f'расхождений: {drifted}.'
+        )
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shopping_list_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Готово'), ('pending', 'Обрабатывается'), ('failed', 'Ошибка обработки')], default='ready', max_length=16, verbose_name='Состояние изображения'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_status',
+            field=models.CharField(choices=[('ready', 'Готово'), ('pending', 'Обрабатывается'), ('failed', 'Ошибка обработки')], default='ready', max_length=16, verbose_name='Состояние аватара'),
+        ),
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=64, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Id объекта')),
+                ('field', models.CharField(max_length=32, verbose_name='Поле')),
+                ('source', models.FileField(upload_to='uploads/pending/', verbose_name='Исходный файл')),
+                ('max_size', models.PositiveIntegerField(verbose_name='Наибольшая сторона')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Обрабатывается'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Состояние')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время постановки')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата и время начала обработки')),
+            ],
+            options={
+                'verbose_name': 'Обработка изображения',
+                'verbose_name_plural': 'Обработка изображений',
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['status', 'id'], name='image_job_status_idx')],
+            },
+        ),
+    ]
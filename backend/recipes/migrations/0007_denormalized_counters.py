@@ -0,0 +1,65 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:49
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, foreign_key):
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(
+                **{foreign_key: models.OuterRef('pk')}
+            ).order_by().values(foreign_key).annotate(
+                count=models.Count('pk')
+            ).values('count'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('recipes', 'User')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Subscription = apps.get_model('recipes', 'Subscription')
+    Recipe.objects.update(favorites_count=count_related(Favorite, 'recipe'))
+    User.objects.update(
+        recipes_count=count_related(Recipe, 'author'),
+        subscriptions_count=count_related(Subscription, 'user'),
+        subscribers_count=count_related(Subscription, 'author')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscriptions_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.RunPython(
+            fill_counters,
+            migrations.RunPython.noop
+        ),
+    ]
@@ -8,9 +8,45 @@ from .constants import (
     DEFAULT_REQUIRED_FIELDS, DEFAULT_USERNAME_FIELD,
     MIN_AMOUNT, MIN_COOKING_TIME, USERNAME_REG_EX
 )
+from .storage import content_addressed_storage
 
 
-class User(AbstractUser):
+class ImageStatus(models.TextChoices):
+    """Состояния обработки загруженного изображения."""
+
+    READY = 'ready', 'Готово'
+    PENDING = 'pending', 'Обрабатывается'
+    FAILED = 'failed', 'Ошибка обработки'
+
+
+class CountersModelMixin:
+    """Примесь моделей со счётчиками в столбцах.
+
+    Счётчики меняются только запросами UPDATE с F(), поэтому при
+    сохранении уже существующей записи они не перезаписываются
+    значениями, прочитанными в память раньше. Отложенные поля, как
+    и в Model.save, не сохраняются и не загружаются.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if not self._state.adding:
+            if update_fields is None:
+                deferred_fields = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.attname not in deferred_fields
+                ]
+            update_fields = [
+                name for name in update_fields
+                if name not in self.counter_fields
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class User(CountersModelMixin, AbstractUser):
     """Модель пользователя."""
 
     email = models.EmailField(
@@ -38,13 +74,38 @@ class User(AbstractUser):
     )
     avatar = models.ImageField(
         upload_to='users/avatars/',
+        storage=content_addressed_storage,
         null=True,
         default=None,
         verbose_name='Аватар'
     )
+    avatar_status = models.CharField(
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        verbose_name='Состояние аватара'
+    )
+    recipes_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    subscriptions_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписок'
+    )
+    subscribers_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
 
     USERNAME_FIELD = DEFAULT_USERNAME_FIELD
     REQUIRED_FIELDS = DEFAULT_REQUIRED_FIELDS
+    counter_fields = (
+        'recipes_count', 'subscriptions_count', 'subscribers_count'
+    )
 
     class Meta:
         ordering = ('username',)
@@ -136,7 +197,7 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class Recipe(CountersModelMixin, models.Model):
     """Модель рецепта."""
 
     author = models.ForeignKey(
@@ -150,10 +211,17 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=content_addressed_storage,
         null=True,
         default=None,
         verbose_name='Изображение'
     )
+    image_status = models.CharField(
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        verbose_name='Состояние изображения'
+    )
     text = models.TextField(verbose_name='Текст')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -175,10 +243,23 @@ class Recipe(models.Model):
         blank=True,
         verbose_name='Дата и время публикации'
     )
+    favorites_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+
+    counter_fields = ('favorites_count',)
 
     class Meta:
-        ordering = ('-created_at',)
+        ordering = ('-created_at', '-id')
         default_related_name = 'recipes'
+        indexes = (
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='recipe_created_at_id_idx'
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -266,3 +347,109 @@ class ShoppingCart(UserRecipeAbstractModel):
     class Meta(UserRecipeAbstractModel.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class ShoppingListItem(models.Model):
+    """Модель итогов списка покупок.
+
+    Хранит суммарное количество продукта по всем рецептам из списка
+    покупок пользователя и пересчитывается при изменении списка
+    или продуктов входящих в него рецептов.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт'
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общая мера'
+    )
+    recipe_count = models.PositiveIntegerField(
+        verbose_name='Рецептов'
+    )
+
+    class Meta:
+        ordering = ('user',)
+        default_related_name = 'shopping_list_items'
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='shopping_list_item_user_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} — {self.total_amount}'
+
+
+class ImageJob(models.Model):
+    """Модель задания на фоновую обработку изображения.
+
+    Исходный файл сохраняется как есть, а декодирование, поворот
+    по EXIF, уменьшение и пересжатие выполняются вне запроса.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        PROCESSING = 'processing', 'Обрабатывается'
+        FAILED = 'failed', 'Ошибка'
+
+    model = models.CharField(
+        max_length=64,
+        verbose_name='Модель'
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name='Id объекта'
+    )
+    field = models.CharField(
+        max_length=32,
+        verbose_name='Поле'
+    )
+    source = models.FileField(
+        upload_to='uploads/pending/',
+        verbose_name='Исходный файл'
+    )
+    max_size = models.PositiveIntegerField(
+        verbose_name='Наибольшая сторона'
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Состояние'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата и время постановки'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата и время начала обработки'
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+        indexes = (
+            models.Index(
+                fields=('status', 'id'),
+                name='image_job_status_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.model}#{self.object_id}.{self.field}'
@@ -0,0 +1,196 @@
+"""Модуль с поиском по продуктам в памяти процесса проекта Foodgram."""
+
+import heapq
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from threading import Lock
+
+from .constants import (
+    FUZZY_SEARCH_CANDIDATES, FUZZY_SEARCH_LIMIT,
+    FUZZY_SEARCH_MAX_POSTINGS, FUZZY_SEARCH_MIN_SIMILARITY
+)
+from .models import Ingredient
+from .versions import get_version
+
+WORD_REG_EX = re.compile(r'\w+')
+# Безударные гласные чаще всего путают при наборе: «малако», «памидор».
+PHONETIC_TABLE = str.maketrans('оёеэ', 'аиии')
+# Символ больше любого другого: все строки с началом prefix
+# лежат в отсортированном списке до prefix + MAX_CHARACTER.
+MAX_CHARACTER = chr(0x10FFFF)
+
+
+def normalize(text):
+    """Приводит строку к виду для сравнения без учёта регистра."""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def phonetic_key(text):
+    """Отдаёт строку с приведёнными друг к другу похожими гласными."""
+    return normalize(text).translate(PHONETIC_TABLE)
+
+
+def trigrams(text):
+    """Отдаёт множество триграмм фонетического ключа, как в pg_trgm."""
+    return {
+        padded[position:position + 3]
+        for word in WORD_REG_EX.findall(phonetic_key(text))
+        for padded in (f'  {word} ',)
+        for position in range(len(padded) - 2)
+    }
+
+
+class IngredientIndex(ABC):
+    """Базовый индекс продуктов в памяти процесса.
+
+    Индекс строится лениво в каждом процессе и перестраивается,
+    когда меняется версия продуктов.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+
+    @abstractmethod
+    def build(self, ingredients):
+        """Строит структуры индекса по списку продуктов."""
+
+    def ensure_fresh(self):
+        """Перестраивает индекс, если данные продуктов изменились."""
+        version = get_version(Ingredient)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self.build(
+                        list(
+                            Ingredient.objects.values(
+                                'id', 'name', 'measurement_unit'
+                            ).iterator()
+                        )
+                    )
+                    self._version = version
+
+
+class IngredientPrefixIndex(IngredientIndex):
+    """Отсортированный индекс продуктов для поиска по началу названия."""
+
+    def __init__(self):
+        super().__init__()
+        self._keys = []
+        self._items = []
+
+    def build(self, ingredients):
+        rows = sorted(
+            (
+                (normalize(ingredient['name']), ingredient)
+                for ingredient in ingredients
+            ),
+            key=lambda row: (row[0], row[1]['measurement_unit'])
+        )
+        self._keys = [key for key, _ in rows]
+        self._items = [ingredient for _, ingredient in rows]
+
+    def search(self, prefix, limit=None):
+        """Отдаёт продукты, название которых начинается с prefix.
+
+        Обе границы совпадений ищутся двоичным поиском, поэтому время
+        поиска не зависит от их числа.
+        """
+        self.ensure_fresh()
+        prefix = normalize(prefix)
+        keys, items = self._keys, self._items
+        start = bisect_left(keys, prefix)
+        stop = bisect_left(keys, prefix + MAX_CHARACTER, start)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return items[start:stop]
+
+
+class IngredientTrigramIndex(IngredientIndex):
+    """Инвертированный индекс триграмм для поиска продуктов с опечатками.
+
+    Кандидаты набираются по самым редким триграммам запроса в пределах
+    FUZZY_SEARCH_MAX_POSTINGS просмотренных записей, после чего лучшие
+    из них ранжируются по точному коэффициенту сходства. Время поиска
+    ограничено сверху и не зависит от числа продуктов.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._items = []
+        self._trigrams = []
+        self._postings = {}
+
+    def build(self, ingredients):
+        postings = defaultdict(list)
+        item_trigrams = []
+        for position, ingredient in enumerate(ingredients):
+            ingredient_trigrams = frozenset(trigrams(ingredient['name']))
+            item_trigrams.append(ingredient_trigrams)
+            for trigram in ingredient_trigrams:
+                postings[trigram].append(position)
+        self._items = ingredients
+        self._trigrams = item_trigrams
+        self._postings = dict(postings)
+
+    def search(
+        self, query,
+        limit=FUZZY_SEARCH_LIMIT,
+        min_similarity=FUZZY_SEARCH_MIN_SIMILARITY
+    ):
+        """Отдаёт продукты, наиболее похожие на query."""
+        self.ensure_fresh()
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return []
+        postings = sorted(
+            (
+                self._postings[trigram]
+                for trigram in query_trigrams
+                if trigram in self._postings
+            ),
+            key=len
+        )
+        shared = Counter()
+        budget = FUZZY_SEARCH_MAX_POSTINGS
+        for positions in postings:
+            shared.update(positions[:budget])
+            budget -= len(positions)
+            if budget <= 0:
+                break
+        scored = []
+        for position, _ in shared.most_common(FUZZY_SEARCH_CANDIDATES):
+            item_trigrams = self._trigrams[position]
+            common = len(query_trigrams & item_trigrams)
+            similarity = common / (
+                len(query_trigrams) + len(item_trigrams) - common
+            )
+            if similarity >= min_similarity:
+                scored.append((similarity, -position))
+        return [
+            self._items[-negative_position]
+            for _, negative_position in heapq.nlargest(limit, scored)
+        ]
+
+
+ingredient_prefix_index = IngredientPrefixIndex()
+ingredient_trigram_index = IngredientTrigramIndex()
+
+
+def fuzzy_search_ingredients(query, limit=FUZZY_SEARCH_LIMIT):
+    """Отдаёт продукты по запросу с опечатками.
+
+    Совпадения по началу названия идут первыми, затем остальные
+    продукты в порядке убывания сходства триграмм.
+    """
+    found = ingredient_prefix_index.search(query, limit=limit)
+    found_ids = {ingredient['id'] for ingredient in found}
+    for ingredient in ingredient_trigram_index.search(query, limit=limit):
+        if len(found) >= limit:
+            break
+        if ingredient['id'] not in found_ids:
+            found.append(ingredient)
+    return found
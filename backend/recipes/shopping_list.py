@@ -0,0 +1,118 @@
+"""Модуль с пересчётом итогов списков покупок проекта Foodgram.
+
+Итоги пересчитываются сигналами при каждой записи в корзину, поэтому
+они не устаревают и после правок из shell или загрузки фикстур.
+Пакетные изменения отключают сигналы и пересчитывают итоги один раз.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .locks import lock_users
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+local = threading.local()
+
+
+@contextmanager
+def shopping_lists_refreshed_by_caller():
+    """Отключает сигналы корзины: вызывающий код пересчитывает итоги сам.
+
+    Нужен для пакетного удаления, чтобы вместо пересчёта на каждую
+    удалённую запись итоги пересчитывались одним вызовом.
+    """
+    local.disabled = True
+    try:
+        yield
+    finally:
+        local.disabled = False
+
+
+def shopping_list_signals_enabled():
+    """Проверяет, должны ли сигналы корзины пересчитывать итоги."""
+    return not getattr(local, 'disabled', False)
+
+
+def get_shopping_list_totals(user_ids, ingredient_ids=None):
+    """Считает итоги списков покупок по рецептам из корзин."""
+    recipe_ingredients = RecipeIngredient.objects.filter(
+        recipe__shoppingcarts__user__in=user_ids
+    )
+    if ingredient_ids is not None:
+        recipe_ingredients = recipe_ingredients.filter(
+            ingredient__in=ingredient_ids
+        )
+    return {
+        (row['recipe__shoppingcarts__user'], row['ingredient']): (
+            row['total_amount'], row['recipe_count']
+        )
+        for row in recipe_ingredients.values(
+            'recipe__shoppingcarts__user', 'ingredient'
+        ).annotate(
+            total_amount=Sum('amount'),
+            recipe_count=Count('id')
+        ).order_by()
+    }
+
+
+def refresh_shopping_list(user_ids, ingredient_ids=None):
+    """Пересчитывает итоги списков покупок пользователей.
+
+    Пересчитываются только строки указанных продуктов, поэтому
+    добавление рецепта в корзину затрагивает столько строк,
+    сколько в нём продуктов. Строки удаляются и вставляются заново
+    под блокировкой пользователей, иначе два встречных пересчёта
+    вставляют одну строку дважды и второй падает на уникальности.
+    """
+    user_ids = list(user_ids)
+    if ingredient_ids is not None:
+        ingredient_ids = list(ingredient_ids)
+    if not user_ids or ingredient_ids == []:
+        return
+    items = ShoppingListItem.objects.filter(user__in=user_ids)
+    if ingredient_ids is not None:
+        items = items.filter(ingredient__in=ingredient_ids)
+    with transaction.atomic():
+        lock_users(*user_ids)
+        items.delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=total_amount,
+                recipe_count=recipe_count
+            )
+            for (user_id, ingredient_id), (
+                total_amount, recipe_count
+            ) in get_shopping_list_totals(user_ids, ingredient_ids).items()
+        )
+
+
+def refresh_recipe_in_shopping_lists(recipe, ingredient_ids):
+    """Пересчитывает списки покупок, в корзинах которых есть рецепт."""
+    refresh_shopping_list(
+        ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values_list('user', flat=True),
+        ingredient_ids
+    )
+
+
+def get_recipe_ingredient_ids(*recipes):
+    """Отдаёт id продуктов рецептов."""
+    return set(
+        RecipeIngredient.objects.filter(
+            recipe__in=recipes
+        ).values_list('ingredient', flat=True)
+    )
+
+
+def refresh_shopping_list_recipes(user_id, recipes):
+    """Пересчитывает список покупок после изменения его рецептов."""
+    refresh_shopping_list(
+        (user_id,),
+        get_recipe_ingredient_ids(*recipes)
+    )
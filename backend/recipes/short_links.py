@@ -0,0 +1,115 @@
+"""Модуль с короткими ссылками на рецепты проекта Foodgram.
+
+Код ссылки — это id рецепта, обратимо перемешанный умножением
+по модулю и записанный в base62 фиксированной длины. По кодам нельзя
+перебрать рецепты подряд, а для раскодирования не нужна база данных.
+
+Результаты проверки существования рецептов, и положительные,
+и отрицательные, хранятся в ограниченном LRU-кэше процесса. Кэш
+сбрасывается, когда меняется версия рецептов, а она увеличивается
+после создания и удаления рецепта.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+from django.urls import reverse
+
+from .constants import (
+    RECIPE_ID_CACHE_SIZE, SHORT_LINK_ALPHABET, SHORT_LINK_BITS,
+    SHORT_LINK_LENGTH, SHORT_LINK_MASK, SHORT_LINK_MULTIPLIER
+)
+from .models import Recipe
+from .versions import get_version
+
+SHORT_LINK_MODULUS = 1 << SHORT_LINK_BITS
+SHORT_LINK_INVERSE = pow(SHORT_LINK_MULTIPLIER, -1, SHORT_LINK_MODULUS)
+SHORT_LINK_BASE = len(SHORT_LINK_ALPHABET)
+SHORT_LINK_DIGITS = {
+    symbol: value for value, symbol in enumerate(SHORT_LINK_ALPHABET)
+}
+
+
+def encode_short_code(recipe_id):
+    """Отдаёт код короткой ссылки для id рецепта."""
+    number = (
+        recipe_id * SHORT_LINK_MULTIPLIER % SHORT_LINK_MODULUS
+    ) ^ SHORT_LINK_MASK
+    symbols = []
+    for _ in range(SHORT_LINK_LENGTH):
+        number, digit = divmod(number, SHORT_LINK_BASE)
+        symbols.append(SHORT_LINK_ALPHABET[digit])
+    return ''.join(reversed(symbols))
+
+
+def decode_short_code(code):
+    """Отдаёт id рецепта по коду или None для неверного кода."""
+    if len(code) != SHORT_LINK_LENGTH:
+        return None
+    number = 0
+    for symbol in code:
+        digit = SHORT_LINK_DIGITS.get(symbol)
+        if digit is None:
+            return None
+        number = number * SHORT_LINK_BASE + digit
+    if number >= SHORT_LINK_MODULUS:
+        return None
+    recipe_id = (
+        (number ^ SHORT_LINK_MASK) * SHORT_LINK_INVERSE % SHORT_LINK_MODULUS
+    )
+    return recipe_id or None
+
+
+def get_short_link_path(recipe_id):
+    """Отдаёт путь короткой ссылки на рецепт.
+
+    Код только из цифр открылся бы по маршруту прежних ссылок с id
+    рецепта, поэтому для таких рецептов отдаётся прежняя ссылка.
+    """
+    code = encode_short_code(recipe_id)
+    if code.isdigit():
+        return reverse('recipes:recipe_legacy_short_link', args=(recipe_id,))
+    return reverse('recipes:recipe_short_link', args=(code,))
+
+
+class RecipeIdCache:
+    """LRU-кэш проверок существования рецептов в памяти процесса."""
+
+    def __init__(self, size=RECIPE_ID_CACHE_SIZE):
+        self._lock = Lock()
+        self._size = size
+        self._version = None
+        self._exists = OrderedDict()
+
+    def get(self, recipe_id, version):
+        """Отдаёт сохранённый результат проверки или None."""
+        with self._lock:
+            if version != self._version:
+                self._exists.clear()
+                self._version = version
+                return None
+            exists = self._exists.get(recipe_id)
+            if exists is not None:
+                self._exists.move_to_end(recipe_id)
+            return exists
+
+    def set(self, recipe_id, version, exists):
+        """Сохраняет результат проверки, вытесняя самый старый."""
+        with self._lock:
+            if version != self._version:
+                return
+            self._exists[recipe_id] = exists
+            if len(self._exists) > self._size:
+                self._exists.popitem(last=False)
+
+    def exists(self, recipe_id):
+        """Проверяет, что рецепт существует."""
+        version = get_version(Recipe)
+        exists = self.get(recipe_id, version)
+        if exists is None:
+            exists = Recipe.objects.filter(id=recipe_id).exists()
+            self.set(recipe_id, version, exists)
+        return exists
+
+
+recipe_id_cache = RecipeIdCache()
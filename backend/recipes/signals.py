@@ -0,0 +1,91 @@
+"""Модуль с обработчиками сигналов приложения рецептов проекта Foodgram."""
+
+from django.db import connections, transaction
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from .counters import change_counters, counter_signals_enabled
+from .fulltext import ensure_sqlite_search_index
+from .models import (
+    Favorite, Ingredient, Recipe, ShoppingCart, Subscription, Tag
+)
+from .shopping_list import (
+    get_recipe_ingredient_ids, refresh_shopping_list,
+    refresh_shopping_list_recipes, shopping_list_signals_enabled
+)
+from .versions import bump_version
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def reference_data_changed(sender, **kwargs):
+    """Увеличивает версию справочных данных после фиксации записи.
+
+    Если увеличить версию внутри транзакции, другой процесс может
+    собрать индекс по ещё старым строкам и сохранить его под новой
+    версией до следующей записи.
+    """
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """Запоминает списки покупок, которые затронет удаление рецепта."""
+    instance.shopping_list_users = list(
+        instance.shoppingcarts.values_list('user', flat=True)
+    )
+    instance.shopping_list_ingredients = get_recipe_ingredient_ids(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Пересчитывает списки покупок после удаления рецепта."""
+    refresh_shopping_list(
+        getattr(instance, 'shopping_list_users', ()),
+        getattr(instance, 'shopping_list_ingredients', ())
+    )
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    """Пересчитывает список покупок после записи в корзину."""
+    if shopping_list_signals_enabled():
+        refresh_shopping_list_recipes(
+            instance.user_id,
+            (instance.recipe_id,)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Subscription)
+def counted_object_saved(sender, instance, created, raw, **kwargs):
+    """Увеличивает счётчики после создания записи."""
+    if created and not raw and counter_signals_enabled():
+        change_counters(sender, (instance,))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Subscription)
+def counted_object_deleted(sender, instance, **kwargs):
+    """Уменьшает счётчики после удаления записи."""
+    if counter_signals_enabled():
+        change_counters(sender, (instance,), sign=-1)
+
+
+@receiver(post_migrate)
+def migrated(sender, using, **kwargs):
+    """Создаёт индекс поиска рецептов в SQLite после миграций."""
+    connection = connections[using]
+    if sender.name == 'recipes' and connection.vendor == 'sqlite':
+        ensure_sqlite_search_index(connection)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_ids_changed(sender, created=True, **kwargs):
+    """Увеличивает версию рецептов после фиксации создания и удаления."""
+    if created:
+        transaction.on_commit(lambda: bump_version(sender))
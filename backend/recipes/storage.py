@@ -0,0 +1,75 @@
+"""Модуль с хранилищем медиафайлов проекта Foodgram.
+
+Файлы изображений называются по хешу содержимого, поэтому одинаковые
+загрузки хранятся один раз, а содержимое файла под одним именем
+никогда не меняется. Из-за общих файлов их нельзя удалять вместе
+с объектом: неиспользуемые файлы удаляет команда collect_media_garbage.
+"""
+
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .constants import CONTENT_HASH_PREFIX_LENGTH
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище с именами файлов по хешу содержимого."""
+
+    def get_content_hash(self, content):
+        """Считает SHA-256 содержимого по частям."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def get_content_name(self, name, content):
+        """Отдаёт имя файла по хешу в каталоге исходного имени."""
+        directory, filename = posixpath.split(name)
+        content_hash = self.get_content_hash(content)
+        return posixpath.join(
+            directory,
+            content_hash[:CONTENT_HASH_PREFIX_LENGTH],
+            content_hash + os.path.splitext(filename)[1].lower()
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self.save_as(
+            self.get_content_name(name, content),
+            content,
+            max_length=max_length
+        )
+
+    def save_as(self, name, content, max_length=None):
+        """Сохраняет файл под заданным именем, без хеширования.
+
+        Содержимое файла определяется его именем, поэтому уже
+        существующий файл не перезаписывается, а копия, сохранённая
+        под другим именем при одновременной записи, удаляется.
+        У существующего файла обновляется время изменения, чтобы
+        collect_media_garbage не удалил его, пока ссылка на него
+        ещё не записана в базу.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            pass
+        else:
+            return name
+        saved_name = super().save(name, content, max_length=max_length)
+        if saved_name != name:
+            self.delete(saved_name)
+        return name
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -0,0 +1,616 @@
+"""Модуль с тестами приложения рецептов проекта Foodgram."""
+
+import io
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib import admin
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.forms.models import model_to_dict
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from .constants import RECIPE_IMAGE_DERIVATIVES
+from .images import (
+    generate_derivatives, get_derivative_name, process_pending_image_jobs
+)
+from .management.commands.import_data import iter_json_array
+from .management.commands.import_recipes import (
+    iter_part_records, split_file
+)
+from .models import (
+    Favorite, ImageJob, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCart, ShoppingListItem, Subscription, Tag, User
+)
+from .search import (
+    IngredientPrefixIndex, IngredientTrigramIndex, fuzzy_search_ingredients
+)
+from .short_links import RecipeIdCache, encode_short_code
+from .storage import content_addressed_storage
+from .versions import bump_version, get_version
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов списков админки не зависит от размера страницы."""
+
+    SMALL_PAGE_SIZE = 5
+    LARGE_PAGE_SIZE = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrator = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='password'
+        )
+        users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='password',
+                avatar=(
+                    f'users/avatars/ab/{index:064x}.jpg' if index % 2
+                    else None
+                )
+            )
+            for index in range(12)
+        ]
+        tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(3)
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'продукт {index}', measurement_unit='г')
+            for index in range(50)
+        )
+        for index in range(48):
+            recipe = Recipe.objects.create(
+                author=users[index % len(users)],
+                name=f'Рецепт {index}',
+                text='Текст рецепта.',
+                cooking_time=10,
+                image=f'recipes/images/cd/{index:064x}.jpg'
+            )
+            recipe.tags.set(tags[:1 + index % len(tags)])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(index + shift) % len(ingredients)],
+                    amount=10 + shift
+                )
+                for shift in range(4)
+            )
+            Favorite.objects.create(
+                user=users[(index + 1) % len(users)], recipe=recipe
+            )
+            ShoppingCart.objects.create(
+                user=users[(index + 2) % len(users)], recipe=recipe
+            )
+        for index, user in enumerate(users):
+            for shift in (1, 2, 3):
+                Subscription.objects.create(
+                    user=user, author=users[(index + shift) % len(users)]
+                )
+
+    def setUp(self):
+        self.client.force_login(self.administrator)
+
+    def test_changelist_queries_do_not_depend_on_page_size(self):
+        for model, model_admin in admin.site._registry.items():
+            meta = model._meta
+            url = reverse(
+                f'admin:{meta.app_label}_{meta.model_name}_changelist'
+            )
+            with self.subTest(model=meta.model_name):
+                self.assertEqual(self.client.get(url).status_code, 200)
+                with patch.object(
+                    model_admin, 'list_per_page', self.SMALL_PAGE_SIZE
+                ), CaptureQueriesContext(connection) as small_page:
+                    self.client.get(url)
+                with patch.object(
+                    model_admin, 'list_per_page', self.LARGE_PAGE_SIZE
+                ), self.assertNumQueries(len(small_page)):
+                    self.client.get(url)
+
+
+class CounterFieldsSaveTest(TestCase):
+    """Сохранение записи не затирает счётчики, изменённые через F()."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            text='Текст рецепта.',
+            cooking_time=10
+        )
+
+    def test_recipe_save_keeps_favorites_count(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=F('favorites_count') + 5
+        )
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 5)
+
+    def test_deferred_recipe_save_updates_loaded_fields(self):
+        recipe = Recipe.objects.only('name').get(pk=self.recipe.pk)
+        recipe.name = 'Новое название'
+        with CaptureQueriesContext(connection) as queries:
+            recipe.save()
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('favorites_count', queries[0]['sql'])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).name, 'Новое название'
+        )
+
+    def test_user_save_keeps_counters(self):
+        user = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=user.pk).update(
+            subscribers_count=F('subscribers_count') + 3
+        )
+        user.set_password('new-password')
+        user.save()
+        user.refresh_from_db()
+        self.assertEqual(user.recipes_count, 1)
+        self.assertEqual(user.subscribers_count, 3)
+        self.assertTrue(user.check_password('new-password'))
+
+
+class ReferenceVersionTest(TestCase):
+    """Версия справочных данных меняется только после фиксации записи."""
+
+    def test_version_is_bumped_on_commit(self):
+        version = get_version(Tag)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Завтрак', slug='breakfast')
+            self.assertEqual(get_version(Tag), version)
+        self.assertNotEqual(get_version(Tag), version)
+
+
+class ShoppingListSignalsTest(TestCase):
+    """Записи в корзину в обход API обновляют итоги списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            text='Текст рецепта.',
+            cooking_time=10
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=200
+        )
+
+    def get_items(self):
+        return list(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient', 'total_amount', 'recipe_count'
+            )
+        )
+
+    def test_check_shopping_lists_rebuilds_drifted_totals(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingListItem.objects.filter(user=self.user).update(
+            total_amount=1
+        )
+        output = io.StringIO()
+        call_command('check_shopping_lists', '--rebuild', stdout=output)
+        self.assertIn('с расхождениями: 1.', output.getvalue())
+        self.assertEqual(self.get_items(), [(self.ingredient.id, 200, 1)])
+
+    def test_admin_recipe_ingredient_changes_refresh_shopping_list(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        administrator = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='password'
+        )
+        self.client.force_login(administrator)
+        recipe_ingredient = RecipeIngredient.objects.get(recipe=self.recipe)
+        response = self.client.post(
+            reverse(
+                'admin:recipes_recipeingredient_change',
+                args=(recipe_ingredient.pk,)
+            ),
+            {
+                'recipe': self.recipe.pk,
+                'ingredient': self.ingredient.pk,
+                'amount': 99
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_items(), [(self.ingredient.id, 99, 1)])
+        response = self.client.post(
+            reverse(
+                'admin:recipes_recipeingredient_delete',
+                args=(recipe_ingredient.pk,)
+            ),
+            {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_items(), [])
+
+    def test_cart_writes_refresh_shopping_list(self):
+        cart = ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.assertEqual(self.get_items(), [(self.ingredient.id, 200, 1)])
+        cart.delete()
+        self.assertEqual(self.get_items(), [])
+
+
+class IngredientAdminSearchTest(TestCase):
+    """Поиск продуктов в админке находит вхождения и опечатки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrator = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='password'
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('молоко', 'молоко сгущённое', 'мука', 'сгущёнка')
+        )
+        bump_version(Ingredient)
+
+    def setUp(self):
+        self.client.force_login(self.administrator)
+
+    def search(self, search_term):
+        response = self.client.get(
+            reverse('admin:recipes_ingredient_changelist'),
+            {'q': search_term}
+        )
+        return {
+            ingredient.name
+            for ingredient in response.context['cl'].result_list
+        }
+
+    def test_substring_search(self):
+        self.assertEqual(
+            self.search('сгущ'), {'молоко сгущённое', 'сгущёнка'}
+        )
+
+    def test_search_with_typo(self):
+        self.assertIn('молоко', self.search('малоко'))
+
+
+class IngredientIndexTest(TestCase):
+    """Индексы продуктов в памяти ищут по данным текущей версии."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in (
+                ('Молоко', 'мл'), ('молоко', 'г'), ('морковь', 'г'),
+                ('мука', 'г'), ('сыр', 'г')
+            )
+        )
+        bump_version(Ingredient)
+
+    def get_names(self, ingredients):
+        return [
+            (ingredient['name'], ingredient['measurement_unit'])
+            for ingredient in ingredients
+        ]
+
+    def test_prefix_search(self):
+        index = IngredientPrefixIndex()
+        self.assertEqual(
+            self.get_names(index.search('МО')),
+            [('молоко', 'г'), ('Молоко', 'мл'), ('морковь', 'г')]
+        )
+        self.assertEqual(
+            self.get_names(index.search('мо', limit=1)), [('молоко', 'г')]
+        )
+        self.assertEqual(index.search('мя'), [])
+        self.assertEqual(len(index.search('')), 5)
+
+    def test_prefix_index_is_rebuilt_on_version_bump(self):
+        index = IngredientPrefixIndex()
+        self.assertEqual(index.search('мёд'), [])
+        Ingredient.objects.bulk_create(
+            (Ingredient(name='мёд', measurement_unit='г'),)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(index.search('мёд'), [])
+        bump_version(Ingredient)
+        self.assertEqual(self.get_names(index.search('мёд')), [('мёд', 'г')])
+
+    def test_trigram_search_tolerates_typos(self):
+        index = IngredientTrigramIndex()
+        self.assertEqual(
+            self.get_names(index.search('марковь', limit=1)),
+            [('морковь', 'г')]
+        )
+        self.assertEqual(
+            {
+                name
+                for name, _ in self.get_names(index.search('малако', limit=2))
+            },
+            {'молоко', 'Молоко'}
+        )
+        self.assertEqual(index.search('!!'), [])
+        self.assertEqual(index.search('кефир'), [])
+
+    def test_trigram_index_is_rebuilt_on_version_bump(self):
+        index = IngredientTrigramIndex()
+        self.assertEqual(index.search('кефир'), [])
+        Ingredient.objects.bulk_create(
+            (Ingredient(name='кефир', measurement_unit='мл'),)
+        )
+        bump_version(Ingredient)
+        self.assertEqual(
+            self.get_names(index.search('кифир')), [('кефир', 'мл')]
+        )
+
+    def test_fuzzy_search_puts_prefix_matches_first(self):
+        found = fuzzy_search_ingredients('мук')
+        self.assertEqual(self.get_names(found[:1]), [('мука', 'г')])
+        self.assertEqual(
+            len({ingredient['id'] for ingredient in found}), len(found)
+        )
+        self.assertEqual(
+            self.get_names(fuzzy_search_ingredients('мо', limit=2)),
+            [('молоко', 'г'), ('Молоко', 'мл')]
+        )
+
+
+def make_image_content(image_format):
+    """Отдаёт содержимое картинки 40x20 в указанном формате."""
+    output = io.BytesIO()
+    Image.new('RGB', (40, 20), 'red').save(output, image_format)
+    return output.getvalue()
+
+
+class ImageDerivativesTest(TestCase):
+    """Изображения из админки и старые файлы получают производные."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrator = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='password'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.recipe = Recipe.objects.create(
+            author=cls.administrator,
+            name='Рецепт',
+            text='Текст рецепта.',
+            cooking_time=10
+        )
+        cls.recipe.tags.set((cls.tag,))
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(
+            MEDIA_ROOT=media_root.name, IMAGE_PROCESSING_WORKERS=0
+        )
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def assert_derivatives_exist(self, field_file, extension):
+        for size in RECIPE_IMAGE_DERIVATIVES:
+            for derivative_extension in (extension, 'webp'):
+                self.assertTrue(field_file.storage.exists(
+                    get_derivative_name(
+                        field_file.name, size, derivative_extension
+                    )
+                ))
+
+    def test_admin_upload_is_queued(self):
+        request = RequestFactory().post('/')
+        request.user = self.administrator
+        model_admin = admin.site._registry[Recipe]
+        data = model_to_dict(self.recipe, exclude=('image',))
+        data['tags'] = [self.tag.pk]
+        form = model_admin.get_form(request, self.recipe)(
+            data=data,
+            files={'image': SimpleUploadedFile(
+                'photo.jpg', make_image_content('JPEG'), 'image/jpeg'
+            )},
+            instance=self.recipe
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            model_admin.save_model(
+                request, form.save(commit=False), form, change=True
+            )
+        self.assertEqual(ImageJob.objects.count(), 1)
+        self.assertEqual(process_pending_image_jobs(), 1)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+        self.assert_derivatives_exist(recipe.image, 'jpg')
+
+    def test_gif_derivatives_are_png(self):
+        self.recipe.image.save(
+            'photo.gif', ContentFile(make_image_content('GIF')), save=False
+        )
+        self.assertTrue(
+            generate_derivatives(self.recipe.image, RECIPE_IMAGE_DERIVATIVES)
+        )
+        self.assert_derivatives_exist(self.recipe.image, 'png')
+        with self.recipe.image.storage.open(get_derivative_name(
+            self.recipe.image.name, 'thumb', 'png'
+        )) as derivative:
+            self.assertEqual(Image.open(derivative).format, 'PNG')
+
+
+class ShortLinksTest(TestCase):
+    """Короткие ссылки и проверка существования рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            id=1234567,
+            author=cls.author,
+            name='Рецепт',
+            text='Текст рецепта.',
+            cooking_time=10
+        )
+
+    def test_legacy_link_with_seven_digit_id(self):
+        for path in (
+            f'/s/{self.recipe.id}/',
+            f'/s/{encode_short_code(self.recipe.id)}/'
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertRedirects(
+                    response,
+                    f'/recipes/{self.recipe.id}/',
+                    fetch_redirect_response=False
+                )
+
+    def test_cache_is_bounded_and_keeps_misses(self):
+        cache = RecipeIdCache(size=2)
+        with self.assertNumQueries(2):
+            self.assertTrue(cache.exists(self.recipe.id))
+            self.assertFalse(cache.exists(self.recipe.id + 1))
+        with self.assertNumQueries(0):
+            self.assertTrue(cache.exists(self.recipe.id))
+            self.assertFalse(cache.exists(self.recipe.id + 1))
+        with self.assertNumQueries(1):
+            cache.exists(self.recipe.id + 2)
+        with self.assertNumQueries(1):
+            cache.exists(self.recipe.id)
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Повторное сохранение файла продлевает его защиту от сборки мусора."""
+
+    def test_save_as_touches_existing_file(self):
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                name = content_addressed_storage.save(
+                    'recipes/images/photo.jpg', ContentFile(b'photo')
+                )
+                path = content_addressed_storage.path(name)
+                os.utime(path, (0, 0))
+                self.assertEqual(
+                    content_addressed_storage.save(
+                        'recipes/images/copy.jpg', ContentFile(b'photo')
+                    ),
+                    name
+                )
+                self.assertGreater(os.path.getmtime(path), 0)
+
+
+class ImportDataTest(TestCase):
+    """Импорт справочников строго разбирает JSON-массив."""
+
+    def parse(self, content):
+        return list(iter_json_array(io.StringIO(content), chunk_size=4))
+
+    def import_tags(self, content, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tags.json')
+            with open(path, 'w', encoding='UTF-8') as data_file:
+                data_file.write(content)
+            call_command('import_tags', path, *args, stdout=io.StringIO())
+
+    def test_valid_arrays_are_parsed(self):
+        self.assertEqual(self.parse('[]'), [])
+        self.assertEqual(self.parse(' [ ] '), [])
+        self.assertEqual(
+            self.parse('[{"name": "соль"} ,\n {"name": "перец"}]'),
+            [{'name': 'соль'}, {'name': 'перец'}]
+        )
+
+    def test_malformed_separators_are_rejected(self):
+        for content in (
+            '[{"a": 1},]', '[{"a": 1} {"b": 2}]', '[{"a": 1},, {"b": 2}]',
+            '[,{"a": 1}]', '[{"a": 1}', '{"a": 1}'
+        ):
+            with self.subTest(content=content):
+                with self.assertRaises(ValueError):
+                    self.parse(content)
+
+    def test_parse_error_reports_record_and_checkpoint(self):
+        with self.assertRaisesMessage(
+            CommandError, 'Запись 3: не удалось разобрать файл'
+        ) as context:
+            self.import_tags(
+                '[{"name": "Завтрак", "slug": "breakfast"},'
+                ' {"name": "Обед", "slug": "lunch"},]',
+                '--batch-size', '1'
+            )
+        self.assertIn(
+            'Последняя контрольная точка: 2 записей.',
+            str(context.exception)
+        )
+
+    def test_tag_name_taken_by_another_slug_is_reported(self):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        for content in (
+            '[{"name": "Завтрак", "slug": "morning"}]',
+            '[{"name": "Обед", "slug": "lunch"},'
+            ' {"name": "Обед", "slug": "dinner"}]'
+        ):
+            with self.subTest(content=content):
+                with self.assertRaisesMessage(CommandError, 'name='):
+                    self.import_tags(content)
+        self.assertEqual(
+            list(Tag.objects.values_list('name', 'slug')),
+            [('Завтрак', 'breakfast')]
+        )
+        self.import_tags('[{"name": "Завтрак", "slug": "breakfast"}]')
+
+    def test_recipe_file_parts_cover_every_line_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.ndjson')
+            for count in (0, 1, 7, 30):
+                with open(path, 'w', encoding='UTF-8') as data_file:
+                    for index in range(count):
+                        data_file.write(
+                            json.dumps({'id': index, 'name': 'щ' * index})
+                            + '\n'
+                        )
+                for parts in (1, 2, 3, 50):
+                    with self.subTest(count=count, parts=parts):
+                        self.assertEqual(
+                            [
+                                record['id']
+                                for start, end in split_file(path, parts)
+                                for record in iter_part_records(
+                                    path, start, end
+                                )
+                            ],
+                            list(range(count))
+                        )
@@ -1,14 +1,24 @@
 """Модуль с маршрутизацией приложения рецептов проекта Foodgram."""
 
-from django.urls import path
+from django.urls import path, register_converter
 
-from .views import recipe_short_link
+from .converters import ShortCodeConverter
+from .views import recipe_legacy_short_link, recipe_short_link
 
 app_name = 'recipes'
 
+register_converter(ShortCodeConverter, 'short_code')
+
+# Прежние ссылки с id идут первыми: id из семи цифр подходит
+# и под формат кода короткой ссылки.
 urlpatterns = [
     path(
         '<int:recipe_id>/',
+        recipe_legacy_short_link,
+        name='recipe_legacy_short_link'
+    ),
+    path(
+        '<short_code:code>/',
         recipe_short_link,
         name='recipe_short_link'
     )
@@ -0,0 +1,35 @@
+"""Модуль с версиями справочных данных проекта Foodgram.
+
+Версия хранится в общем кэше и увеличивается при любой записи в модель,
+поэтому каждый процесс может дёшево проверить актуальность своих
+локальных структур без обращения к базе данных.
+"""
+
+from time import time_ns
+
+from django.core.cache import cache
+
+from .constants import REFERENCE_VERSION_KEY
+
+
+def get_version_key(model):
+    """Отдаёт ключ кэша с версией данных модели."""
+    return REFERENCE_VERSION_KEY.format(model._meta.label_lower)
+
+
+def get_version(model):
+    """Отдаёт текущую версию данных модели.
+
+    Начальная версия берётся из часов, чтобы после вытеснения ключа
+    из кэша она не совпала ни с одной из уже выданных.
+    """
+    return cache.get_or_set(get_version_key(model), time_ns, timeout=None)
+
+
+def bump_version(model):
+    """Увеличивает версию данных модели."""
+    key = get_version_key(model)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(model)
@@ -2,14 +2,29 @@
 
 from django.http.response import Http404
 from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
 from django.views.decorators.http import require_GET
 
-from .models import Recipe
+from .constants import SHORT_LINK_MAX_AGE
+from .short_links import decode_short_code, recipe_id_cache
+
+
+def redirect_to_recipe(recipe_id):
+    """Отдаёт кэшируемый редирект на страницу рецепта."""
+    if recipe_id is None or not recipe_id_cache.exists(recipe_id):
+        raise Http404('Рецепт не существует!')
+    response = redirect(f'/recipes/{recipe_id}/')
+    patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+    return response
 
 
 @require_GET
-def recipe_short_link(request, recipe_id):
+def recipe_short_link(request, code):
     """Редирект на рецепт по короткой ссылке."""
-    if not Recipe.objects.filter(id=recipe_id).exists():
-        raise Http404(f'Рецепта с id "{recipe_id}" не существует!')
-    return redirect(f'/recipes/{recipe_id}/')
+    return redirect_to_recipe(decode_short_code(code))
+
+
+@require_GET
+def recipe_legacy_short_link(request, recipe_id):
+    """Редирект на рецепт по ранее выданной ссылке с id рецепта."""
+    return redirect_to_recipe(recipe_id)